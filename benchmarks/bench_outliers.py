@@ -0,0 +1,34 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from outliers import flag_outliers
+from synthetic_data import make_kpi_data
+
+ROW_COUNTS = [10_000, 100_000, 1_000_000]
+REPEATS = 3
+
+
+# Proporción de valores con errores que inyecta make_kpi_data
+OUTLIER_FRACTION = 0.001
+
+
+# Mide el tiempo de la detección de atípicos para distintos tamaños de datos
+# y compara la cantidad de filas marcadas con la de errores inyectados
+def main():
+    print(f"{'filas':>10} {'mejor (ms)':>12} {'ns/fila':>10} {'atípicos':>10} {'inyectados':>11}")
+    for rows in ROW_COUNTS:
+        data = make_kpi_data(rows, outlier_fraction=OUTLIER_FRACTION)
+        timings = []
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            flagged = flag_outliers(data)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        print(f"{rows:>10} {best * 1000:>12.1f} {best / rows * 1e9:>10.1f} {int(flagged['Outlier'].sum()):>10} {int(rows * OUTLIER_FRACTION):>11}")
+
+
+if __name__ == "__main__":
+    main()
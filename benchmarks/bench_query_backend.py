@@ -0,0 +1,38 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from query_backend import QUERY_TABLES, create_backend, duckdb
+from synthetic_data import make_kpi_data
+
+ROW_COUNTS = [1_000, 10_000, 100_000, 1_000_000]
+REPEATS = 5
+
+# Una selección típica: un rango de años y dos países
+FILTERS = ((2017, 2021), 'Todas', ['Argentina', 'Brasil'])
+
+
+# Compara la carga y las tres tablas de la aplicación en cada backend a medida que crecen las filas
+def main():
+    backends = ['pandas'] + (['duckdb'] if duckdb is not None else [])
+    print(f"{'filas':>10} {'backend':>8} {'carga (ms)':>11} {'tablas (ms)':>12}")
+    for rows in ROW_COUNTS:
+        data = make_kpi_data(rows)
+        for name in backends:
+            start = time.perf_counter()
+            backend = create_backend(data, name)
+            load_ms = (time.perf_counter() - start) * 1000
+
+            timings = []
+            for _ in range(REPEATS):
+                start = time.perf_counter()
+                for table in QUERY_TABLES:
+                    backend.aggregate(table, *FILTERS)
+                timings.append(time.perf_counter() - start)
+            print(f"{rows:>10} {name:>8} {load_ms:>11.1f} {min(timings) * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+import argparse
+import http.server
+import json
+import multiprocessing
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from synthetic_data import COUNTRIES, STATIONS, make_kpi_data
+
+PAGE_PATH = os.path.join(REPO_ROOT, 'pages', '1_Eficiencia_Operativa.py')
+
+# Años del dataset sintético (make_kpi_data genera 2015-2023)
+MIN_YEAR, MAX_YEAR = 2015, 2023
+
+
+# Servidor HTTP local que reemplaza a la hoja de Google Sheets
+def start_data_server(csv_bytes):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/csv; charset=utf-8')
+            self.send_header('Content-Length', str(len(csv_bytes)))
+            self.end_headers()
+            self.wfile.write(csv_bytes)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, name='kpi-data-stub', daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/kpi.csv"
+
+
+# Código de la página con data_url apuntando al servidor local
+def page_source(url):
+    with open(PAGE_PATH, encoding='utf-8') as f:
+        source = f.read()
+    return re.sub(r'data_url\s*=\s*"[^"]+"', lambda match: f'data_url = "{url}"', source, count=1)
+
+
+def _widget(widgets, label):
+    return next(widget for widget in widgets if widget.label == label)
+
+
+# Interacciones de un analista, con su peso relativo
+def _change_years(at, rng):
+    start = rng.randint(MIN_YEAR, MAX_YEAR)
+    _widget(at.slider, 'Selecciona el rango de años:').set_value((start, rng.randint(start, MAX_YEAR)))
+
+
+def _change_station(at, rng):
+    _widget(at.selectbox, 'Selecciona una Estación').set_value(rng.choice(['Todas'] + STATIONS))
+
+
+def _change_countries(at, rng):
+    countries = ['Todos'] if rng.random() < 0.3 else rng.sample(COUNTRIES, rng.randint(1, 3))
+    _widget(at.multiselect, 'Selecciona Países').set_value(countries)
+
+
+def _toggle_outliers(at, rng):
+    checkbox = _widget(at.checkbox, 'Excluir valores atípicos de los cálculos')
+    checkbox.set_value(not checkbox.value)
+
+
+def _drill_down(at, rng):
+    drill_country = _widget(at.selectbox, 'País')
+    drill_country.set_value(rng.choice(drill_country.options))
+
+
+INTERACTIONS = [
+    (_change_years, 3),
+    (_change_station, 2),
+    (_change_countries, 3),
+    (_toggle_outliers, 1),
+    (_drill_down, 1),
+]
+
+# AppTest reemplaza el Runtime global en cada ejecución, así que las ejecuciones de un proceso
+# van de a una. La espera por el turno es un efecto de la prueba, no de la página: se mide aparte
+# y la latencia (y los SLO) corresponden sólo a la ejecución del script.
+_run_lock = threading.Lock()
+
+
+# Una sesión: carga la página y repite interacciones hasta el final de la prueba
+def run_session(source, deadline, think_time, seed, results):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    actions, weights = zip(*INTERACTIONS)
+    at = AppTest.from_string(source, default_timeout=300)
+    action = None
+    while time.time() < deadline:
+        if action is not None:
+            try:
+                action(at, rng)
+            except StopIteration:
+                # El widget no está en la página (por ejemplo, la carga anterior falló)
+                pass
+        queued = time.perf_counter()
+        with _run_lock:
+            start = time.perf_counter()
+            try:
+                at.run()
+                error = at.exception[0].value if at.exception else None
+            except Exception as e:
+                error = repr(e)
+            finished = time.perf_counter()
+        results.append((finished - start, start - queued, error))
+
+        # Tiempo de lectura del analista antes de la siguiente interacción
+        time.sleep(rng.uniform(0, 2 * think_time))
+        action = rng.choices(actions, weights)[0]
+
+
+# Un proceso de Streamlit con varias sesiones concurrentes (una por hilo, como el servidor)
+def run_worker(worker, source, sessions, duration, think_time):
+    usage_start = resource.getrusage(resource.RUSAGE_SELF)
+    wall_start = time.perf_counter()
+    deadline = time.time() + duration
+
+    results = []
+    threads = [
+        threading.Thread(target=run_session, args=(source, deadline, think_time, worker * 1000 + i, results))
+        for i in range(sessions)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    wall = time.perf_counter() - wall_start
+    cpu = (usage.ru_utime - usage_start.ru_utime) + (usage.ru_stime - usage_start.ru_stime)
+    return {
+        'worker': worker,
+        'sessions': sessions,
+        'latencies': [latency for latency, _, _ in results],
+        'lock_waits': [wait for _, wait, _ in results],
+        'errors': sum(1 for _, _, error in results if error is not None),
+        'error_samples': sorted({error for _, _, error in results if error is not None})[:5],
+        'wall_seconds': wall,
+        'cpu_seconds': cpu,
+        'cpu_percent': 100 * cpu / wall if wall else 0.0,
+        'max_rss_mb': usage.ru_maxrss / 1024,  # ru_maxrss está en KB en Linux
+    }
+
+
+def _percentiles(latencies, prefix=''):
+    if not latencies:
+        return {f'{prefix}p50': float('nan'), f'{prefix}p95': float('nan'), f'{prefix}p99': float('nan')}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {f'{prefix}p50': float(p50), f'{prefix}p95': float(p95), f'{prefix}p99': float(p99)}
+
+
+# Resumen de toda la prueba y de cada proceso: latencia de la ejecución (p50...) y espera por el turno (wait_p50...)
+def summarize(worker_results):
+    wall_seconds = max(result['wall_seconds'] for result in worker_results)
+    latencies = [latency for result in worker_results for latency in result['latencies']]
+    lock_waits = [wait for result in worker_results for wait in result['lock_waits']]
+    errors = sum(result['errors'] for result in worker_results)
+    summary = {
+        'reruns': len(latencies),
+        'errors': errors,
+        'error_rate': errors / len(latencies) if latencies else 0.0,
+        'throughput': len(latencies) / wall_seconds if wall_seconds else 0.0,
+        **_percentiles(latencies),
+        **_percentiles(lock_waits, 'wait_'),
+        'workers': [],
+    }
+    for result in worker_results:
+        summary['workers'].append({
+            'worker': result['worker'],
+            'sessions': result['sessions'],
+            'reruns': len(result['latencies']),
+            'errors': result['errors'],
+            'error_samples': result['error_samples'],
+            'throughput': len(result['latencies']) / result['wall_seconds'] if result['wall_seconds'] else 0.0,
+            **_percentiles(result['latencies']),
+            **_percentiles(result['lock_waits'], 'wait_'),
+            'cpu_seconds': result['cpu_seconds'],
+            'cpu_percent': result['cpu_percent'],
+            'max_rss_mb': result['max_rss_mb'],
+        })
+    return summary
+
+
+# Presupuestos incumplidos (lista vacía si se cumplen todos); la latencia no incluye la espera por el turno
+def check_slos(summary, args):
+    violations = []
+    for name in ('p50', 'p95', 'p99'):
+        budget = getattr(args, f'slo_{name}')
+        if budget is not None and summary[name] > budget:
+            violations.append(f"latencia {name} {summary[name]:.3f}s > {budget:.3f}s")
+    if args.slo_throughput is not None and summary['throughput'] < args.slo_throughput:
+        violations.append(f"throughput {summary['throughput']:.2f}/s < {args.slo_throughput:.2f}/s")
+    if args.slo_error_rate is not None and summary['error_rate'] > args.slo_error_rate:
+        violations.append(f"errores {summary['error_rate']:.1%} > {args.slo_error_rate:.1%}")
+    if args.slo_rss_mb is not None:
+        for worker in summary['workers']:
+            if worker['max_rss_mb'] > args.slo_rss_mb:
+                violations.append(f"memoria del proceso {worker['worker']} {worker['max_rss_mb']:.0f}MB > {args.slo_rss_mb:.0f}MB")
+    return violations
+
+
+def print_summary(summary):
+    print(f"{'proceso':>8} {'sesiones':>9} {'ejecuciones':>12} {'errores':>8} {'por seg':>8} "
+          f"{'p50 (s)':>8} {'p95 (s)':>8} {'p99 (s)':>8} {'esp p50':>8} {'esp p95':>8} "
+          f"{'CPU (s)':>8} {'CPU %':>6} {'RSS (MB)':>9}")
+    for worker in summary['workers']:
+        print(f"{worker['worker']:>8} {worker['sessions']:>9} {worker['reruns']:>12} {worker['errors']:>8} "
+              f"{worker['throughput']:>8.2f} {worker['p50']:>8.3f} {worker['p95']:>8.3f} {worker['p99']:>8.3f} "
+              f"{worker['wait_p50']:>8.3f} {worker['wait_p95']:>8.3f} "
+              f"{worker['cpu_seconds']:>8.1f} {worker['cpu_percent']:>6.0f} {worker['max_rss_mb']:>9.0f}")
+    print(f"{'total':>8} {'':>9} {summary['reruns']:>12} {summary['errors']:>8} {summary['throughput']:>8.2f} "
+          f"{summary['p50']:>8.3f} {summary['p95']:>8.3f} {summary['p99']:>8.3f} "
+          f"{summary['wait_p50']:>8.3f} {summary['wait_p95']:>8.3f}")
+    for worker in summary['workers']:
+        for error in worker['error_samples']:
+            print(f"error en el proceso {worker['worker']}: {error}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga de la página de Eficiencia Operativa")
+    parser.add_argument('--sessions', type=int, default=10, help="sesiones concurrentes en total")
+    parser.add_argument('--workers', type=int, default=2, help="procesos de Streamlit simulados")
+    parser.add_argument('--duration', type=float, default=60, help="duración de la prueba en segundos")
+    parser.add_argument('--think-time', type=float, default=1.0, help="pausa media entre interacciones en segundos")
+    parser.add_argument('--rows', type=int, default=50_000, help="filas del CSV sintético")
+    parser.add_argument('--json', help="archivo donde guardar el resumen en JSON")
+    parser.add_argument('--slo-p50', type=float, default=1.0, help="latencia p50 máxima en segundos")
+    parser.add_argument('--slo-p95', type=float, default=3.0, help="latencia p95 máxima en segundos")
+    parser.add_argument('--slo-p99', type=float, default=5.0, help="latencia p99 máxima en segundos")
+    parser.add_argument('--slo-throughput', type=float, help="ejecuciones por segundo mínimas")
+    parser.add_argument('--slo-error-rate', type=float, default=0.0, help="proporción máxima de ejecuciones con error")
+    parser.add_argument('--slo-rss-mb', type=float, help="memoria máxima por proceso en MB")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    server, url = start_data_server(make_kpi_data(args.rows).to_csv(index=False).encode('utf-8'))
+
+    # Caché compartido nuevo para cada prueba; los procesos lo heredan del entorno
+    cache_dir = tempfile.mkdtemp(prefix='kpi-load-test-')
+    os.environ['KPI_CACHE_PATH'] = os.path.join(cache_dir, 'cache.sqlite')
+    os.environ.setdefault('KPI_DATA_REFRESH_SECONDS', str(int(args.duration) + 3600))
+
+    # Las sesiones se reparten entre los procesos
+    source = page_source(url)
+    workers = max(1, min(args.workers, args.sessions))
+    sessions = [args.sessions // workers + (1 if i < args.sessions % workers else 0) for i in range(workers)]
+
+    print(f"{args.sessions} sesiones en {workers} procesos durante {args.duration:.0f}s ({args.rows} filas, datos en {url})")
+    with multiprocessing.get_context('spawn').Pool(workers) as pool:
+        worker_results = pool.starmap(
+            run_worker,
+            [(i, source, count, args.duration, args.think_time) for i, count in enumerate(sessions)]
+        )
+    server.shutdown()
+
+    summary = summarize(worker_results)
+    print_summary(summary)
+    violations = check_slos(summary, args)
+    summary['slo_violations'] = violations
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+
+    if violations:
+        print("SLO incumplido: " + "; ".join(violations))
+        return 1
+    print("SLO cumplido")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+# Valores posibles de cada columna del dataset de KPI
+COUNTRIES = ['Argentina', 'Bolivia', 'Brasil', 'Paraguay', 'Uruguay']
+STATIONS = ['Aprobacion', 'Vigencia', 'Elegibilidad', 'PrimerDesembolso']
+PRODUCTIVITY = ['Eficiente', 'Regular', 'Ineficiente']
+
+
+# Genera un DataFrame con la misma forma que la hoja de Google Sheets
+def make_kpi_data(rows, seed=0, outlier_fraction=0.001):
+    rng = np.random.default_rng(seed)
+    kpi = rng.gamma(shape=2.0, scale=3.0, size=rows).round(2)
+
+    # Inyectar algunos errores de carga: meses negativos y valores absurdos
+    n_outliers = int(rows * outlier_fraction)
+    outlier_index = rng.choice(rows, size=n_outliers, replace=False)
+    kpi[outlier_index[::2]] = -kpi[outlier_index[::2]]
+    kpi[outlier_index[1::2]] = kpi[outlier_index[1::2]] * 100
+
+    return pd.DataFrame({
+        'IDEtapa': rng.integers(1, max(rows // 3, 2), size=rows),
+        'Pais': rng.choice(COUNTRIES, size=rows),
+        'Tipo_KPI': rng.choice(STATIONS, size=rows),
+        'AÑO': rng.integers(2015, 2024, size=rows).astype(float),
+        'KPI': kpi,
+        'Productividad': rng.choice(PRODUCTIVITY, size=rows),
+    })
@@ -0,0 +1,159 @@
+import altair as alt
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Claves del agregado fino compartido por todos los paneles
+COMPARISON_KEYS = ['Pais', 'Tipo_KPI', 'AÑO']
+
+# Tablas que se comparan: filas y columnas de cada una
+COMPARISON_TABLES = {
+    'estacion_pais': ('Tipo_KPI', 'Pais'),
+    'pais_año': ('Pais', 'AÑO'),
+    'estacion_año': ('Tipo_KPI', 'AÑO'),
+}
+
+MAX_PANELS = 4
+
+
+# Un único recorrido de los datos: suma, conteo y filas por (Pais, Tipo_KPI, AÑO).
+# Las filas sin país o sin estación se conservan, como en las métricas de la página; sólo se
+# descartan las que no tienen año, que ningún rango de años incluye.
+def fine_aggregates(data):
+    df = data.dropna(subset=['AÑO'])
+    grouped = df.groupby(COMPARISON_KEYS, sort=True, dropna=False)
+    groups = grouped['KPI'].agg(Suma='sum', Conteo='count', Filas='size').reset_index()
+    groups['AÑO'] = groups['AÑO'].astype(int)
+    # Grupo de cada fila, para contar proyectos únicos sin volver a filtrar el DataFrame
+    row_groups = grouped.ngroup().to_numpy()
+    return groups, row_groups, df['IDEtapa'].to_numpy()
+
+
+# El agregado fino se calcula una sola vez por versión de los datos y variante, como get_query_backend
+@st.cache_resource(max_entries=4)
+def get_fine_aggregates(data_version, variant, _data):
+    return fine_aggregates(_data)
+
+
+# Qué grupos del agregado fino pertenecen a un panel
+def panel_group_mask(groups, panel):
+    selected_years, selected_station, selected_countries = panel
+    mask = (groups['AÑO'] >= selected_years[0]) & (groups['AÑO'] <= selected_years[1])
+    if selected_station != 'Todas':
+        mask &= groups['Tipo_KPI'] == selected_station
+    if 'Todos' not in selected_countries:
+        mask &= groups['Pais'].isin(selected_countries)
+    return mask.to_numpy()
+
+
+# KPI promedio de una tabla a partir de sumas y conteos: no hace falta volver a las filas
+def _mean_pivot(panel_groups, table):
+    row, column = COMPARISON_TABLES[table]
+    totals = panel_groups.groupby([row, column])[['Suma', 'Conteo']].sum()
+    mean = (totals['Suma'] / totals['Conteo'].replace(0, np.nan)).rename('KPI')
+    return mean.unstack(column)
+
+
+# Calcula métricas y tablas de todos los paneles sobre el mismo agregado fino
+def compare_panels(aggregates, panels):
+    groups, row_groups, project_ids = aggregates
+    results = []
+    for panel in panels:
+        group_mask = panel_group_mask(groups, panel)
+        panel_groups = groups[group_mask]
+
+        # Proyectos únicos: las filas del panel se obtienen del grupo de cada fila
+        row_mask = group_mask[row_groups]
+        conteo = panel_groups['Conteo'].sum()
+        metrics = {
+            'average_kpi': panel_groups['Suma'].sum() / conteo if conteo else float('nan'),
+            # nunique descarta los proyectos sin IDEtapa, como summary_metrics
+            'unique_operation_count': int(pd.Series(project_ids[row_mask]).nunique()),
+            # Como en summary_metrics: las filas sin estación no cuentan como estaciones
+            'total_stations': int(panel_groups.loc[panel_groups['Tipo_KPI'].notna(), 'Filas'].sum()),
+        }
+        tables = {table: _mean_pivot(panel_groups, table) for table in COMPARISON_TABLES}
+        country_totals = panel_groups.groupby('Pais')[['Suma', 'Conteo']].sum()
+        country_kpi = (country_totals['Suma'] / country_totals['Conteo'].replace(0, np.nan)).rename('KPI')
+        results.append({'metrics': metrics, 'tables': tables, 'country_kpi': country_kpi})
+    return results
+
+
+# Diferencia de una tabla respecto del panel base (se alinean filas y columnas)
+def table_delta(table, base_table):
+    table, base_table = table.align(base_table)
+    return (table - base_table).round(2)
+
+
+def _panel_label(panel):
+    selected_years, selected_station, selected_countries = panel
+    countries = 'Todos' if 'Todos' in selected_countries else ', '.join(selected_countries)
+    return f"{countries} {selected_years[0]}–{selected_years[1]} ({selected_station})"
+
+
+# Sección de comparación: varios paneles de filtros calculados en una sola pasada
+def show_comparison(data, data_version, variant):
+    st.header("Comparación de Selecciones")
+
+    years = data['AÑO'].dropna().astype(int)
+    min_year, max_year = int(years.min()), int(years.max())
+    all_stations = ['Todas'] + list(data['Tipo_KPI'].dropna().unique())
+    all_countries = ['Todos'] + list(data['Pais'].dropna().unique())
+
+    panel_count = st.number_input('Cantidad de selecciones', min_value=2, max_value=MAX_PANELS, value=2)
+
+    # Un panel de filtros por columna
+    panels = []
+    for i, column in enumerate(st.columns(panel_count)):
+        with column:
+            st.subheader(f"Selección {i + 1}")
+            selected_years = st.slider('Años', min_year, max_year, (min_year, max_year), key=f'comparison_years_{i}')
+            selected_station = st.selectbox('Estación', all_stations, key=f'comparison_station_{i}')
+            selected_countries = st.multiselect('Países', all_countries, default='Todos', key=f'comparison_countries_{i}')
+            panels.append((selected_years, selected_station, selected_countries or ['Todos']))
+
+    results = compare_panels(get_fine_aggregates(data_version, variant, data), panels)
+    base = results[0]
+
+    # Métricas de cada panel con la diferencia respecto de la primera selección
+    for column, panel, result in zip(st.columns(panel_count), panels, results):
+        metrics = result['metrics']
+        is_base = result is base
+        with column:
+            st.caption(_panel_label(panel))
+            st.metric("Tiempo Promedio en Meses", f"{metrics['average_kpi']:.2f}",
+                      None if is_base else f"{metrics['average_kpi'] - base['metrics']['average_kpi']:.2f}",
+                      delta_color='inverse')
+            st.metric("Proyectos", metrics['unique_operation_count'],
+                      None if is_base else metrics['unique_operation_count'] - base['metrics']['unique_operation_count'])
+            st.metric("Total de Estaciones", metrics['total_stations'],
+                      None if is_base else metrics['total_stations'] - base['metrics']['total_stations'])
+
+    # Gráfico de KPI promedio por país, agrupado por selección
+    chart_data = pd.concat([
+        result['country_kpi'].reset_index().assign(Seleccion=f"{i + 1}")
+        for i, result in enumerate(results)
+    ])
+    chart = alt.Chart(chart_data).mark_bar().encode(
+        x=alt.X('Seleccion:N', title=''),
+        y=alt.Y('KPI:Q', title='KPI Promedio'),
+        color='Seleccion:N',
+        column=alt.Column('Pais:N', title='País'),
+        tooltip=['Seleccion', 'Pais', alt.Tooltip('KPI:Q', format='.2f')]
+    )
+    st.altair_chart(chart)
+
+    # Tablas de cada selección y su diferencia con la primera
+    table_titles = {
+        'estacion_pais': "KPI Promedio por Estación y País",
+        'pais_año': "KPI Promedio por País y Año",
+        'estacion_año': "KPI Promedio por Estación y Año",
+    }
+    for table, title in table_titles.items():
+        st.subheader(title)
+        for i, (panel, result) in enumerate(zip(panels, results)):
+            st.write(f"Selección {i + 1}: {_panel_label(panel)}")
+            st.dataframe(result['tables'][table].round(2).fillna(''))
+            if i > 0:
+                st.write(f"Diferencia Selección {i + 1} − Selección 1")
+                st.dataframe(table_delta(result['tables'][table], base['tables'][table]).fillna(''))
@@ -0,0 +1,220 @@
+import io
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pandas as pd
+
+from query_backend import GROUP_COLUMNS, pivot_result
+from shared_cache import shared_result
+
+# Hilos para calcular en paralelo los nodos independientes de un plan
+PLAN_WORKERS = int(os.environ.get('KPI_PLAN_WORKERS', 4))
+
+_plan_pool = ThreadPoolExecutor(max_workers=PLAN_WORKERS, thread_name_prefix='kpi-plan')
+
+
+# Ejecuta un nodo en el hilo actual y devuelve un Future ya resuelto
+def _run_inline(function, *args):
+    future = Future()
+    try:
+        future.set_result(function(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+# Opciones de una sección, en el orden en que se aplican sobre la tabla pivotada de KPI promedio:
+#   fill: valor para las celdas sin datos
+#   counts: agrega el conteo de KPI por columna (sufijo _count)
+#   round: decimales
+#   total_rows: nombre de la columna con el total de filas (estaciones) de cada fila de la tabla
+#   int_columns / int_index: etiquetas de columnas o filas como enteros (años)
+#   blank: reemplaza las celdas sin datos por un texto vacío
+#   reset_index: lleva las filas a una columna
+SECTION_OPTIONS = {
+    'fill': None,
+    'counts': False,
+    'round': None,
+    'total_rows': None,
+    'int_columns': False,
+    'int_index': False,
+    'blank': False,
+    'reset_index': False,
+}
+
+# Tablas de la página de Eficiencia Operativa.
+# 'results' expone agregados sin pivotar (tablas de Arrow) para gráficos y reportes.
+EFICIENCIA_SPEC = {
+    'results': {
+        'station_country': ('Tipo_KPI', 'Pais'),
+        'country_year': ('Pais', 'AÑO'),
+        'station_year': ('Tipo_KPI', 'AÑO'),
+    },
+    'sections': {
+        'station_country_table': {
+            'rows': 'Tipo_KPI', 'columns': 'Pais', 'fill': 0, 'round': 2, 'total_rows': 'Total_Estaciones', 'blank': True,
+            'excel': {'output': 'station_country_excel', 'index': True},
+        },
+        'country_year_table': {
+            'rows': 'Pais', 'columns': 'AÑO', 'round': 2, 'blank': True, 'int_columns': True, 'reset_index': True,
+            'excel': {'output': 'country_year_excel', 'index': False},
+        },
+        'country_year_summary': {
+            'rows': 'Pais', 'columns': 'AÑO', 'fill': 0, 'counts': True, 'round': 2,
+        },
+        'station_year_table': {
+            'rows': 'Tipo_KPI', 'columns': 'AÑO', 'counts': True, 'round': 2, 'blank': True,
+            'excel': {'output': 'station_year_excel', 'index': True},
+        },
+        'year_station_chart': {
+            'rows': 'AÑO', 'columns': 'Tipo_KPI', 'fill': 0, 'int_index': True,
+        },
+    },
+}
+
+# Tablas y datos de los gráficos de la página de Gráficos Generales
+GRAFICOS_SPEC = {
+    'sections': {
+        'year_station_chart': {
+            'rows': 'AÑO', 'columns': 'Tipo_KPI', 'fill': 0, 'int_index': True,
+        },
+        'country_year_table': {
+            'rows': 'Pais', 'columns': 'AÑO', 'round': 2, 'blank': True, 'int_columns': True, 'reset_index': True,
+            'excel': {'output': 'country_year_excel', 'index': False},
+        },
+        'country_year_chart': {
+            'rows': 'Pais', 'columns': 'AÑO', 'fill': 0,
+        },
+        'station_country_table': {
+            'rows': 'Tipo_KPI', 'columns': 'Pais', 'round': 2, 'blank': True,
+            'excel': {'output': 'station_country_excel', 'index': True},
+        },
+        'country_station_chart': {
+            'rows': 'Pais', 'columns': 'Tipo_KPI', 'fill': 0,
+        },
+        'station_year_table': {
+            'rows': 'Tipo_KPI', 'columns': 'AÑO', 'round': 2, 'blank': True,
+            'excel': {'output': 'station_year_excel', 'index': True},
+        },
+    },
+}
+
+
+# Convierte un DataFrame a los bytes de un archivo de Excel
+def to_excel_bytes(df, index):
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        df.to_excel(writer, index=index)
+    return output.getvalue()
+
+
+# La agrupación no depende del orden: (Tipo_KPI, Pais) y (Pais, Tipo_KPI) usan el mismo resultado
+def _grouping_key(rows, columns):
+    if rows == columns or rows not in GROUP_COLUMNS or columns not in GROUP_COLUMNS:
+        raise ValueError(f"Agrupación no válida: {rows} x {columns}")
+    return tuple(sorted((rows, columns)))
+
+
+# Identifica una sección por su contenido, no por su nombre: dos secciones iguales se calculan una vez
+def _section_key(section):
+    unknown = set(section) - set(SECTION_OPTIONS) - {'rows', 'columns', 'excel'}
+    if unknown:
+        raise ValueError(f"Opciones de sección desconocidas: {', '.join(sorted(unknown))}")
+    return (section['rows'], section['columns']) + tuple(section.get(option, default) for option, default in SECTION_OPTIONS.items())
+
+
+# Arma una tabla a partir del agregado de su agrupación
+def build_section(result, section):
+    rows, columns = section['rows'], section['columns']
+    fill, counts, decimals, total_rows, int_columns, int_index, blank, reset_index = _section_key(section)[2:]
+
+    table = pivot_result(result, rows, columns)
+    if fill is not None:
+        table = table.fillna(fill)
+    if counts:
+        count_table = pivot_result(result, rows, columns, values='Conteo').fillna(0)
+        count_table.columns = [f"{col}_count" for col in count_table.columns]
+        table = pd.concat([table, count_table], axis=1)
+    if decimals is not None:
+        table = table.round(decimals)
+    if total_rows:
+        row_totals = pivot_result(result, rows, columns, values='Filas').sum(axis=1).astype(int)
+        table[total_rows] = table.index.map(row_totals)
+    if int_columns:
+        table.columns = table.columns.astype(int)
+    if int_index:
+        table.index = table.index.map(int)
+    if blank:
+        table = table.fillna('')
+    if reset_index:
+        table = table.reset_index()
+    return table
+
+
+class DashboardPlan:
+    """Plan de cálculo compilado a partir de la especificación de una página.
+
+    El plan tiene tres niveles: agrupaciones del backend, secciones (tablas pivotadas) y archivos
+    de Excel. Las agrupaciones y secciones repetidas se calculan una sola vez, los nodos de un mismo
+    nivel se calculan en paralelo y cada nodo se guarda en el caché compartido.
+    """
+
+    def __init__(self, spec):
+        self.groupings = set()
+        self.results = {}
+        self.sections = {}
+        self.section_outputs = {}
+        self.excel = {}
+
+        for name, (rows, columns) in spec.get('results', {}).items():
+            self.results[name] = _grouping_key(rows, columns)
+            self.groupings.add(self.results[name])
+
+        for name, section in spec.get('sections', {}).items():
+            grouping = _grouping_key(section['rows'], section['columns'])
+            self.groupings.add(grouping)
+            section_key = _section_key(section)
+            self.sections.setdefault(section_key, (grouping, section))
+            self.section_outputs[name] = section_key
+
+            if 'excel' in section:
+                excel = section['excel']
+                self.excel[excel['output']] = (section_key, bool(excel.get('index', True)))
+
+    # Calcula (o recupera del caché compartido) todas las salidas del plan para una selección de filtros.
+    # Con parallel=False los nodos se calculan en el hilo que llama (el precalentado mide así su CPU).
+    def run(self, backend, data_version, filter_params, selected_years, selected_station, selected_countries, parallel=True):
+        submit = _plan_pool.submit if parallel else _run_inline
+
+        def shared(namespace, key, compute):
+            return shared_result(namespace, data_version, ('plan',) + key + filter_params, compute)
+
+        # Cada agrupación se pide en el orden de su clave: todas las páginas comparten el resultado en el
+        # caché compartido (las tablas se pivotan por nombre de columna, el orden no importa)
+        grouping_futures = {
+            grouping: submit(backend.group, *grouping, selected_years, selected_station, selected_countries)
+            for grouping in sorted(self.groupings)
+        }
+        grouping_results = {grouping: future.result() for grouping, future in grouping_futures.items()}
+
+        section_futures = {
+            section_key: submit(shared, 'plan', section_key,
+                                lambda result=grouping_results[grouping], section=section: build_section(result, section))
+            for section_key, (grouping, section) in self.sections.items()
+        }
+        section_results = {section_key: future.result() for section_key, future in section_futures.items()}
+
+        excel_futures = {
+            output: submit(shared, 'excel', section_key + (index,),
+                           lambda table=section_results[section_key], index=index: to_excel_bytes(table, index=index))
+            for output, (section_key, index) in self.excel.items()
+        }
+
+        outputs = {name: grouping_results[grouping] for name, grouping in self.results.items()}
+        outputs.update({name: section_results[section_key] for name, section_key in self.section_outputs.items()})
+        outputs.update({output: future.result() for output, future in excel_futures.items()})
+        return outputs
+
+
+EFICIENCIA_PLAN = DashboardPlan(EFICIENCIA_SPEC)
+GRAFICOS_PLAN = DashboardPlan(GRAFICOS_SPEC)
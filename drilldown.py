@@ -0,0 +1,176 @@
+import io
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Orden de las claves del índice: las filas quedan agrupadas por país, estación y año
+DRILLDOWN_KEYS = ['Pais', 'Tipo_KPI', 'AÑO']
+
+# Columnas que se muestran en la tabla de detalle
+DETAIL_COLUMNS = ['IDEtapa', 'Pais', 'Tipo_KPI', 'AÑO', 'KPI', 'Productividad']
+
+
+class GroupIndex:
+    """Índice de grupos en formato CSR sobre las filas ordenadas por (Pais, Tipo_KPI, AÑO).
+
+    Cada grupo ocupa el rango contiguo rows[offsets[g]:offsets[g + 1]], por lo que
+    resolver una celda cuesta O(grupos + filas devueltas) en lugar de filtrar todo el DataFrame.
+    """
+
+    def __init__(self, data, keys=DRILLDOWN_KEYS):
+        self.keys = list(keys)
+
+        # Ordenar una sola vez las filas por las claves del índice
+        self.rows = data.sort_values(self.keys, kind='stable').reset_index(drop=True)
+
+        # Detectar dónde empieza cada grupo comparando cada fila con la anterior
+        key_frame = self.rows[self.keys]
+        boundaries = (key_frame != key_frame.shift()).any(axis=1).to_numpy()
+        starts = np.flatnonzero(boundaries)
+        self.offsets = np.append(starts, len(self.rows))
+
+        # Tabla de grupos: una fila por combinación de claves
+        self.groups = key_frame.iloc[starts].reset_index(drop=True)
+
+    def __len__(self):
+        return len(self.groups)
+
+    # Devuelve las filas que contribuyen a una celda; cada clave acepta un valor o una lista
+    def lookup(self, **selection):
+        mask = np.ones(len(self.groups), dtype=bool)
+        for key, value in selection.items():
+            if value is None:
+                continue
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            mask &= self.groups[key].isin(values).to_numpy()
+
+        group_ids = np.flatnonzero(mask)
+        if len(group_ids) == 0:
+            return self.rows.iloc[0:0]
+
+        # Concatenar los rangos contiguos de cada grupo seleccionado
+        positions = np.concatenate([
+            np.arange(self.offsets[g], self.offsets[g + 1]) for g in group_ids
+        ])
+        return self.rows.iloc[positions]
+
+
+# Construye el índice una sola vez por versión de los datos y variante, como get_query_backend
+@st.cache_resource(max_entries=4)
+def build_group_index(data_version, variant, _data):
+    return GroupIndex(_data.dropna(subset=DRILLDOWN_KEYS))
+
+
+# Convierte el detalle a Excel sólo cuando el usuario lo pide
+@st.cache_data
+def detail_to_excel(detail):
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        detail.to_excel(writer, index=False)
+    return output.getvalue()
+
+
+# Última celda o segmento elegido en una tabla o gráfico de la página
+SELECTION_STATE_KEY = 'drill_selection'
+
+
+def _key_value(key, value):
+    if key == 'AÑO':
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    return value
+
+
+# Traduce la celda elegida en una tabla pivotada a valores de las claves del índice
+def _cell_selection(table, cell, rows, columns):
+    position, column = cell
+    row_value = table[rows].iloc[position] if rows in table.columns else table.index[position]
+    selection = {rows: _key_value(rows, row_value)}
+
+    # Las columnas de conteo ("2019_count") corresponden a la misma celda que la de KPI
+    column = str(column)
+    if column.endswith('_count'):
+        column = column[:-len('_count')]
+    column_value = _key_value(columns, column)
+    if column_value is not None and column != rows and column in {str(c) for c in table.columns}:
+        selection[columns] = column_value
+    return {key: value for key, value in selection.items() if value is not None}
+
+
+def _remember_selection(selection):
+    st.session_state[SELECTION_STATE_KEY] = selection or None
+
+
+# Tabla pivotada (filas x columnas) en la que hacer clic en una celda muestra sus proyectos
+def selectable_dataframe(table, key, rows, columns):
+    def on_select():
+        cells = st.session_state[key].selection.cells
+        _remember_selection(_cell_selection(table, cells[0], rows, columns) if cells else None)
+
+    st.dataframe(table, key=key, on_select=on_select, selection_mode='single-cell')
+
+
+# Gráfico de Vega-Lite con un parámetro de selección por punto sobre las claves del índice
+def selectable_chart(spec, key, param):
+    def on_select():
+        points = st.session_state[key].selection.get(param) or []
+        point = points[0] if points else {}
+        _remember_selection({name: _key_value(name, value) for name, value in point.items() if name in DRILLDOWN_KEYS})
+
+    st.vega_lite_chart(spec, key=key, on_select=on_select, selection_mode=param)
+
+
+# Sección de detalle: resuelve una celda de las tablas pivotadas o un segmento del gráfico a sus proyectos (IDEtapa)
+def show_drilldown(index, filtered_df, selected_years):
+    st.header("Detalle de Proyectos")
+
+    countries = sorted(filtered_df['Pais'].dropna().unique())
+    stations = sorted(filtered_df['Tipo_KPI'].dropna().unique())
+    year_values = [float(year) for year in range(selected_years[0], selected_years[1] + 1)]
+    options = {'Pais': countries, 'Tipo_KPI': stations, 'AÑO': year_values}
+
+    # Se ignoran los valores que no son claves de la tabla (como Total_Estaciones) o que quedaron fuera de los filtros
+    selection = {
+        key: value for key, value in (st.session_state.get(SELECTION_STATE_KEY) or {}).items()
+        if value in options[key]
+    }
+
+    if selection:
+        st.caption("Selección: " + ", ".join(
+            f"{key} = {int(value) if key == 'AÑO' else value}" for key, value in selection.items()))
+        if st.button('Quitar selección'):
+            _remember_selection(None)
+            st.rerun()
+        lookup = {key: selection.get(key, values) for key, values in options.items()}
+    else:
+        # Sin una celda elegida, el detalle se elige con las listas
+        st.caption("Haz clic en una celda de las tablas o en un segmento del gráfico para ver sus proyectos.")
+        col1, col2, col3 = st.columns(3)
+        drill_country = col1.selectbox('País', ['Todos'] + countries, key='drill_country')
+        drill_station = col2.selectbox('Estación', ['Todas'] + stations, key='drill_station')
+        drill_year = col3.selectbox('Año', ['Todos'] + [int(year) for year in year_values], key='drill_year')
+
+        # Una opción "Todos/Todas" equivale a todos los valores presentes en los filtros actuales
+        lookup = {
+            'Pais': countries if drill_country == 'Todos' else drill_country,
+            'Tipo_KPI': stations if drill_station == 'Todas' else drill_station,
+            'AÑO': year_values if drill_year == 'Todos' else float(drill_year),
+        }
+
+    detail = index.lookup(**lookup)
+    detail = detail[[column for column in DETAIL_COLUMNS if column in detail.columns]]
+
+    st.write(f"Proyectos: {detail['IDEtapa'].nunique()} — Estaciones: {len(detail)}")
+    st.dataframe(detail, hide_index=True)
+
+    # La exportación se genera sólo cuando se solicita
+    if st.button('Preparar detalle como Excel'):
+        st.download_button(
+            label="Descargar detalle de proyectos como Excel",
+            data=detail_to_excel(detail),
+            file_name='detalle_de_proyectos.xlsx',
+            mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
@@ -0,0 +1,91 @@
+import altair as alt
+
+from dashboard_spec import EFICIENCIA_PLAN
+from shared_cache import shared_result
+
+# Definir el esquema de color personalizado del gráfico por país y estación
+color_scheme = {
+    "Aprobacion": "lightgreen",
+    "Vigencia": "skyblue",
+    "PrimerDesembolso": "salmon",
+    "Elegibilidad": "gold"
+}
+
+# Parámetro de selección del gráfico por país y estación: un clic en un segmento abre su detalle
+CHART_SELECTION = 'segmento'
+
+
+# Parámetros que identifican una selección de filtros en el caché compartido.
+# El orden de los países no cambia los resultados, por eso se ordenan.
+def filter_key(selected_years, selected_station, selected_countries, exclude_flagged):
+    return (tuple(int(year) for year in selected_years), selected_station, tuple(sorted(selected_countries)), bool(exclude_flagged))
+
+
+# Aplica los filtros de año, estación y país con las opciones "Todas" y "Todos"
+def apply_filters(data, selected_years, selected_station, selected_countries):
+    filtered_df = data[
+        (data['AÑO'] >= selected_years[0]) &
+        (data['AÑO'] <= selected_years[1])
+    ]
+    if selected_station != 'Todas':
+        filtered_df = filtered_df[filtered_df['Tipo_KPI'] == selected_station]
+    if 'Todos' not in selected_countries:
+        filtered_df = filtered_df[filtered_df['Pais'].isin(selected_countries)]
+    return filtered_df
+
+
+# Cálculo de KPI Promedio, conteo de operaciones únicas y total de estaciones
+def summary_metrics(filtered_df):
+    return {
+        'average_kpi': float(filtered_df['KPI'].mean()),
+        'unique_operation_count': int(filtered_df['IDEtapa'].nunique()),
+        'total_stations': int(filtered_df['Tipo_KPI'].count()),  # Conteo total de estaciones (filas)
+    }
+
+
+# Gráfico de barras apiladas con el KPI promedio por país y estación
+def country_station_chart(station_country_result):
+    kpi_avg_by_country_station = station_country_result.select(['Pais', 'Tipo_KPI', 'KPI']).to_pandas()
+    segment = alt.selection_point(name=CHART_SELECTION, fields=['Pais', 'Tipo_KPI'])
+
+    bar_chart = alt.Chart(kpi_avg_by_country_station).mark_bar().add_params(segment).encode(
+        x='Pais:N',
+        y=alt.Y('sum(KPI):Q', stack='zero', title='KPI Promedio'),
+        color=alt.Color('Tipo_KPI:N', scale=alt.Scale(domain=list(color_scheme.keys()), range=list(color_scheme.values()))),
+        tooltip=['Pais', 'Tipo_KPI', 'KPI']
+    )
+
+    # Crear las etiquetas de texto para cada barra
+    text_chart = alt.Chart(kpi_avg_by_country_station).mark_text(
+        align='center',
+        baseline='middle',
+        color='black',  # Color del texto
+    ).encode(
+        x='Pais:N',
+        y=alt.Y('sum(KPI):Q', stack='zero', title=''),
+        text=alt.Text('sum(KPI):Q', format='.2f'),
+        color=alt.value('black')  # Esto asegura que el texto sea negro
+    )
+
+    # Combinar gráficos de barras y texto
+    return (bar_chart + text_chart).properties(
+        width=600,
+        height=400,
+        title='KPI Promedio por País y Estación'
+    )
+
+
+# Calcula (o recupera del caché compartido) los resultados de la página de Eficiencia Operativa.
+# La página y el precalentado del caché usan esta misma función, así las claves coinciden.
+def efficiency_outputs(backend, data, data_version, selected_years, selected_station, selected_countries, exclude_flagged, parallel=True):
+    params = filter_key(selected_years, selected_station, selected_countries, exclude_flagged)
+
+    def shared(namespace, name, compute):
+        return shared_result(namespace, data_version, ('eficiencia', name) + params, compute)
+
+    # Tablas, agregados y archivos de Excel de la especificación de la página
+    outputs = EFICIENCIA_PLAN.run(backend, data_version, params, selected_years, selected_station, selected_countries, parallel)
+    outputs['metrics'] = shared('metricas', 'resumen', lambda: summary_metrics(
+        apply_filters(data, selected_years, selected_station, selected_countries)))
+    outputs['chart_spec'] = shared('grafico', 'pais_estacion_seleccion', lambda: country_station_chart(outputs['station_country']).to_dict())
+    return outputs
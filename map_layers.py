@@ -0,0 +1,135 @@
+import json
+import os
+
+import numpy as np
+
+# Límites de los países (Natural Earth 1:110m, dominio público) incluidos en el repositorio
+COUNTRY_SHAPES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'paises.geojson')
+
+# Tolerancia de simplificación en grados y decimales que se conservan en las coordenadas
+SIMPLIFY_TOLERANCE = 0.05
+COORDINATE_DECIMALS = 3
+
+# Colores de la escala: verde para tiempos cortos, rojo para tiempos largos
+LOW_COLOR = np.array([0, 150, 64], dtype=np.float32)
+HIGH_COLOR = np.array([227, 6, 19], dtype=np.float32)
+
+
+# Simplificación Ramer-Douglas-Peucker de un anillo de coordenadas
+def simplify_ring(ring, tolerance=SIMPLIFY_TOLERANCE):
+    points = np.asarray(ring, dtype=np.float64)
+    if len(points) <= 4:
+        return points
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        offsets = points[start + 1:end] - points[start]
+        length = np.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+
+    simplified = points[keep]
+    # Un anillo necesita al menos cuatro puntos (el primero se repite al final)
+    return simplified if len(simplified) >= 4 else points
+
+
+def _simplify_geometry(geometry, tolerance):
+    if geometry['type'] == 'Polygon':
+        polygons = [geometry['coordinates']]
+    else:
+        polygons = geometry['coordinates']
+    simplified = [
+        [np.round(simplify_ring(ring, tolerance), COORDINATE_DECIMALS).tolist() for ring in polygon]
+        for polygon in polygons
+    ]
+    if geometry['type'] == 'Polygon':
+        return {'type': 'Polygon', 'coordinates': simplified[0]}
+    return {'type': 'MultiPolygon', 'coordinates': simplified}
+
+
+# Lee el GeoJSON local y simplifica las geometrías; el resultado se guarda en caché
+def load_country_shapes(path=COUNTRY_SHAPES_PATH, tolerance=SIMPLIFY_TOLERANCE):
+    with open(path, encoding='utf-8') as f:
+        collection = json.load(f)
+    features = [
+        {
+            'type': 'Feature',
+            'properties': dict(feature['properties']),
+            'geometry': _simplify_geometry(feature['geometry'], tolerance),
+        }
+        for feature in collection['features']
+    ]
+    countries = [feature['properties']['Pais'] for feature in features]
+    return countries, features
+
+
+# Calcula los atributos por país como arreglos compactos alineados con el orden de las geometrías
+def country_attributes(filtered_df, countries, statistic='mean'):
+    kpi_by_country = filtered_df.groupby('Pais')['KPI']
+    if statistic == 'mean':
+        values = kpi_by_country.mean()
+    else:
+        values = kpi_by_country.quantile(statistic)
+    counts = kpi_by_country.count()
+
+    values = values.reindex(countries).to_numpy(dtype=np.float32)
+    counts = counts.reindex(countries).fillna(0).to_numpy(dtype=np.int32)
+
+    # Normalizar los valores para la escala de color y la altura de las columnas
+    has_value = ~np.isnan(values)
+    scaled = np.zeros(len(values), dtype=np.float32)
+    if has_value.any():
+        low, high = np.nanmin(values), np.nanmax(values)
+        if high > low:
+            scaled[has_value] = (values[has_value] - low) / (high - low)
+        else:
+            scaled[has_value] = 0.5
+
+    colors = np.empty((len(values), 4), dtype=np.uint8)
+    colors[:, :3] = (LOW_COLOR + (HIGH_COLOR - LOW_COLOR) * scaled[:, None]).round()
+    colors[:, 3] = np.where(has_value, 180, 40)
+
+    return {
+        'value': values,
+        'count': counts,
+        'scaled': scaled,
+        'color': colors,
+    }
+
+
+# Combina las geometrías en caché con los atributos del filtro actual.
+# Las geometrías no se copian: cada Feature nuevo referencia la misma lista de coordenadas.
+def attach_attributes(features, attributes):
+    values = attributes['value']
+    counts = attributes['count'].tolist()
+    colors = attributes['color'].tolist()
+    scaled = attributes['scaled'].tolist()
+    merged = []
+    for i, feature in enumerate(features):
+        value = None if np.isnan(values[i]) else round(float(values[i]), 2)
+        merged.append({
+            'type': 'Feature',
+            'geometry': feature['geometry'],
+            'properties': {
+                **feature['properties'],
+                'KPI': value,
+                'Estaciones': counts[i],
+                'color': colors[i],
+                'altura': scaled[i],
+            },
+        })
+    return {'type': 'FeatureCollection', 'features': merged}
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+# Columnas que identifican cada grupo para el cálculo robusto
+OUTLIER_GROUP_COLUMNS = ['Tipo_KPI', 'Pais']
+
+# Umbral del puntaje z robusto (Iglewicz y Hoaglin recomiendan 3.5)
+OUTLIER_THRESHOLD = 3.5
+
+# Constante que hace comparable la MAD con la desviación estándar en datos normales
+MAD_SCALE = 0.6745
+
+
+# Marca los valores atípicos de KPI por grupo Tipo_KPI/Pais usando mediana y MAD
+def flag_outliers(data, value_column='KPI', group_columns=OUTLIER_GROUP_COLUMNS, threshold=OUTLIER_THRESHOLD):
+    """Agrega las columnas 'Puntaje_Robusto', 'Outlier' y 'Motivo_Outlier' al DataFrame.
+
+    Todos los grupos se procesan en un único barrido vectorizado (groupby/transform),
+    sin iterar grupo por grupo en Python.
+    """
+    flagged = data.copy()
+    kpi = pd.to_numeric(flagged[value_column], errors='coerce')
+    keys = [flagged[column] for column in group_columns]
+
+    # Los meses tienen una cola larga a la derecha: el puntaje se calcula sobre log(1 + KPI)
+    # para no marcar como error a los proyectos que simplemente demoraron más
+    log_kpi = np.log1p(kpi.where(kpi >= 0))
+
+    # Mediana por grupo y desviación absoluta de cada fila respecto de ella
+    median = log_kpi.groupby(keys, dropna=False, sort=False).transform('median')
+    abs_deviation = (log_kpi - median).abs()
+    mad = abs_deviation.groupby(keys, dropna=False, sort=False).transform('median')
+
+    # Si más de la mitad del grupo tiene el mismo valor la MAD es cero;
+    # en ese caso se usa la desviación absoluta media (escalada para ser comparable)
+    mean_deviation = abs_deviation.groupby(keys, dropna=False, sort=False).transform('mean')
+    scale = mad.where(mad > 0, mean_deviation * 1.253314 * MAD_SCALE)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        robust_score = MAD_SCALE * abs_deviation / scale
+    robust_score = robust_score.where(scale > 0, 0.0)
+
+    # Los meses negativos son siempre errores de carga, sin importar el grupo
+    is_negative = kpi < 0
+    is_extreme = robust_score > threshold
+
+    flagged['Puntaje_Robusto'] = robust_score.round(2)
+    flagged['Outlier'] = (is_negative | is_extreme).fillna(False).astype(bool)
+    flagged['Motivo_Outlier'] = np.select(
+        [is_negative.fillna(False), is_extreme.fillna(False)],
+        ['KPI negativo', 'Fuera de rango para su estación y país'],
+        default=''
+    )
+    return flagged
+
+
+# Devuelve sólo las filas que no fueron marcadas como atípicas
+def exclude_outliers(data):
+    return data[~data['Outlier']]
@@ -1,9 +1,13 @@
 import streamlit as st
-import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
-import io
-import altair as alt
+from outliers import exclude_outliers
+from drilldown import build_group_index, selectable_chart, selectable_dataframe, show_drilldown
+from comparison import show_comparison
+from query_backend import data_variant, get_query_backend
+from shared_cache import load_shared_csv, SharedCacheBackend
+from kpi_tables import CHART_SELECTION, apply_filters, efficiency_outputs, filter_key
+from warming import record_request, warm_hit_rate
 
 # Configuración inicial de la página
 st.set_page_config(page_title="Análisis de Eficiencia Operativa", page_icon="📊")
@@ -11,10 +15,10 @@ st.set_page_config(page_title="Análisis de Eficiencia Operativa", page_icon="
 # URLs de las hojas de Google Sheets
 data_url= "https://docs.google.com/spreadsheets/d/e/2PACX-1vQE1hYnTcdOn72tyNOEQ_6L97XtPx8Hsd1ep-wxi9rLaJJm0KWTGb7JonuPzO-EyQH8g2UZ9rwK0CuF/pub?gid=1428049919&single=true&output=csv"
 
-# Función para cargar los datos desde la URL
+# Función para cargar los datos desde la URL (descarga compartida entre procesos)
 def load_data_from_url(url):
     try:
-        return pd.read_csv(url, header=0)
+        return load_shared_csv(url)
     except Exception as e:
         st.error("Error al cargar los datos: " + str(e))
         return None
@@ -27,10 +31,20 @@ def main():
     data = load_data_from_url(data_url)
 
     if data is not None:
+        # Versión de los datos cargados; identifica los resultados en el caché compartido
+        data_version = data.attrs['version']
 
         # Configurar el estilo de Seaborn para los gráficos
         sns.set_theme(style="whitegrid")
 
+        # Modo comparación: varias selecciones lado a lado, calculadas en una sola pasada
+        if st.sidebar.checkbox('Modo comparación', value=False):
+            comparison_exclude = st.checkbox('Excluir valores atípicos de los cálculos', value=False, key='comparison_exclude')
+            if comparison_exclude:
+                data = exclude_outliers(data)
+            show_comparison(data, data_version, data_variant(comparison_exclude))
+            return
+
    # Definir la paleta de colores para los países
         country_colors = {
             "Argentina": "#36A9E1",
@@ -53,34 +67,42 @@ def main():
         all_countries = ['Todos'] + list(data['Pais'].dropna().unique())
         selected_countries = st.multiselect('Selecciona Países', all_countries, default='Todos')
 
+        # Opción para excluir los valores atípicos de todos los cálculos
+        exclude_flagged = st.checkbox('Excluir valores atípicos de los cálculos', value=False)
+        outlier_rows = data[data['Outlier']]
+        if exclude_flagged:
+            data = exclude_outliers(data)
+
         # Aplicar filtros al DataFrame
-        filtered_df = data[
-            (data['AÑO'] >= selected_years[0]) &
-            (data['AÑO'] <= selected_years[1])
-        ]
+        filtered_df = apply_filters(data, selected_years, selected_station, selected_countries)
 
-        # Filtro por estación con opción "Todas"
-        if selected_station != 'Todas':
-            filtered_df = filtered_df[filtered_df['Tipo_KPI'] == selected_station]
+        # Registrar la selección (sin datos del usuario) para precalentar las combinaciones más usadas,
+        # sólo cuando cambian los filtros: las demás ejecuciones (detalle, descargas) no cuentan
+        request_key = (data_version,) + filter_key(selected_years, selected_station, selected_countries, exclude_flagged)
+        if st.session_state.get('last_filter_request') != request_key:
+            record_request(data_version, selected_years, selected_station, selected_countries, exclude_flagged)
+            st.session_state['last_filter_request'] = request_key
+        st.sidebar.caption(f"Aciertos del caché precalentado: {warm_hit_rate(data_version):.0%}")
 
-        # Filtro por país con opción "Todos"
-        if 'Todos' not in selected_countries:
-            filtered_df = filtered_df[filtered_df['Pais'].isin(selected_countries)]
+        # Métricas, tablas, gráfico y archivos de Excel; se reutilizan del caché compartido si ya existen
+        variant = data_variant(exclude_flagged)
+        backend = SharedCacheBackend(get_query_backend(data_version, variant, data), data_version, variant)
+        outputs = efficiency_outputs(backend, data, data_version, selected_years, selected_station, selected_countries, exclude_flagged)
 
         # Incluir gráficos
         st.header("         Análisis de la Eficiencia Operativa")
         figsize = (7, 5)  # Definir el tamaño de la figura para los gráficos
 
-        # Cálculo de KPI Promedio y conteo de operaciones únicas
-        average_kpi = filtered_df['KPI'].mean()
-        unique_operation_count = filtered_df['IDEtapa'].nunique()
-        total_stations = filtered_df['Tipo_KPI'].count() # Conteo total de estaciones (filas)
-
         # Mostrar métricas de KPI Promedio, conteo de operaciones únicas y total de estaciones
+        metrics = outputs['metrics']
         col1, col2, col3 = st.columns(3)
-        col1.metric("Tiempo Promedio en Meses", f"{average_kpi:.2f}")
-        col2.metric("Proyectos", unique_operation_count)
-        col3.metric("Total de Estaciones", total_stations)
+        col1.metric("Tiempo Promedio en Meses", f"{metrics['average_kpi']:.2f}")
+        col2.metric("Proyectos", metrics['unique_operation_count'])
+        col3.metric("Total de Estaciones", metrics['total_stations'])
+
+        # Listado de los valores atípicos detectados en la carga de datos
+        with st.expander(f"Valores Atípicos Detectados ({len(outlier_rows)})"):
+            st.dataframe(outlier_rows[['IDEtapa', 'Pais', 'Tipo_KPI', 'AÑO', 'KPI', 'Puntaje_Robusto', 'Motivo_Outlier']])
 
        
         # Función auxiliar para agregar etiquetas de valor en los gráficos de barra
@@ -142,117 +164,27 @@ def main():
             "PrimerDesembolso": "#E30613"
         }
 
-        # Aplicar filtros al DataFrame
-        filtered_df = data[
-            (data['AÑO'] >= selected_years[0]) &
-            (data['AÑO'] <= selected_years[1])
-        ]
-
-        if selected_station != 'Todas':
-            filtered_df = filtered_df[filtered_df['Tipo_KPI'] == selected_station]
-
-        # Modificado para manejar múltiples selecciones de países
-        if 'Todos' not in selected_countries:
-            filtered_df = filtered_df[filtered_df['Pais'].isin(selected_countries)]
-    
         # Preparación de datos para el gráfico de barras apiladas por estaciones
-        kpi_by_year_station = filtered_df.pivot_table(values='KPI', index='AÑO', columns='Tipo_KPI', aggfunc='mean').fillna(0)
-        kpi_by_year_station.index = kpi_by_year_station.index.map(int)
+        kpi_by_year_station = outputs['year_station_chart']
 
         # Creamos una lista de colores basada en los países presentes en el DataFrame y en el orden correcto
         # Crear una lista de colores basada en las estaciones presentes en el DataFrame
         colors = [station_colors.get(station, "#333333") for station in kpi_by_year_station.columns]
 
-        filtered_df['AÑO'] = filtered_df['AÑO'].astype(int)     
-
-        # Pivotear el DataFrame para obtener el KPI promedio por país y año
-        kpi_pivot_df = filtered_df.pivot_table(values='KPI', index='Pais', columns='AÑO', aggfunc='mean')
-
-        # Redondear todos los valores numéricos a dos decimales
-        kpi_pivot_df = kpi_pivot_df.round(2)
-
-        # Opción para reemplazar los valores None/NaN con un string vacío
-        kpi_pivot_df = kpi_pivot_df.fillna('')
-
-        # Convertir las etiquetas de las columnas a enteros (los años)
-        kpi_pivot_df.columns = kpi_pivot_df.columns.astype(int)
-
-        # Resetear el índice para llevar 'ESTACIONES' a una columna
-        kpi_pivot_df.reset_index(inplace=True)
-
-        # Preparar los datos para el gráfico
-        kpi_avg_by_country_station = filtered_df.groupby(['Pais', 'Tipo_KPI'])['KPI'].mean().reset_index()
-
-        # Definir el esquema de color personalizado
-        color_scheme = {
-            "Aprobacion": "lightgreen",
-            "Vigencia": "skyblue",
-            "PrimerDesembolso": "salmon",
-            "Elegibilidad": "gold"
-        }
-
-        # Crear el gráfico de barras apiladas
-        bar_chart = alt.Chart(kpi_avg_by_country_station).mark_bar().encode(
-            x='Pais:N',
-            y=alt.Y('sum(KPI):Q', stack='zero', title='KPI Promedio'),
-            color=alt.Color('Tipo_KPI:N', scale=alt.Scale(domain=list(color_scheme.keys()), range=list(color_scheme.values()))),
-            tooltip=['Pais', 'Tipo_KPI', 'KPI']
-        )
-
-        # Crear las etiquetas de texto para cada barra
-        text_chart = alt.Chart(kpi_avg_by_country_station).mark_text(
-            align='center',
-            baseline='middle',
-            color='black',  # Color del texto
-        ).encode(
-            x='Pais:N',
-            y=alt.Y('sum(KPI):Q', stack='zero', title=''),
-            text=alt.Text('sum(KPI):Q', format='.2f'),
-            color=alt.value('black')  # Esto asegura que el texto sea negro
-        )
-
-        # Combinar gráficos de barras y texto
-        final_chart = (bar_chart + text_chart).properties(
-            width=600,
-            height=400,
-            title='KPI Promedio por País y Estación'
-        )
-
-        final_chart
+        # Gráfico de barras apiladas por país y estación (especificación guardada en el caché compartido);
+        # un clic en un segmento muestra sus proyectos en el detalle
+        selectable_chart(outputs['chart_spec'], 'grafico_pais_estacion', CHART_SELECTION)
 
         # Crear la tabla pivotada con estaciones como filas y países como columnas
         st.header("KPI Promedio por Estación y País")
 
-        # Conteo total de estaciones por tipo de KPI
-        total_station_count = filtered_df['Tipo_KPI'].value_counts()
-        total_station_count.name = 'Total_Estaciones'
-
-        # Agregar la columna de conteo total al DataFrame pivotado
-        kpi_pivot_df_by_station_country = filtered_df.pivot_table(values='KPI', index='Tipo_KPI', columns='Pais', aggfunc='mean').fillna(0)
-
-        # Redondear los valores numéricos a dos decimales
-        kpi_pivot_df_by_station_country = kpi_pivot_df_by_station_country.round(2)
-
-        # Agregar la columna de conteo total
-        kpi_pivot_df_by_station_country['Total_Estaciones'] = kpi_pivot_df_by_station_country.index.map(total_station_count)
-
-        # Opción para reemplazar los valores None/NaN con un string vacío
-        kpi_pivot_df_by_station_country = kpi_pivot_df_by_station_country.fillna('')
-
         # Muestra el DataFrame en la aplicación
-        st.dataframe(kpi_pivot_df_by_station_country)
-
-
-        # Convertir el DataFrame pivotado a un archivo de Excel para la descarga
-        output_by_station_country = io.BytesIO()
-        with pd.ExcelWriter(output_by_station_country, engine='openpyxl') as writer:
-            kpi_pivot_df_by_station_country.to_excel(writer, index=True)
-        output_by_station_country.seek(0)  # Regresamos al principio del stream para que streamlit pueda leer el contenido
+        selectable_dataframe(outputs['station_country_table'], 'tabla_estacion_pais', 'Tipo_KPI', 'Pais')
 
         # Botón de descarga en Streamlit
         st.download_button(
             label="Descargar KPI promedio por estación y país como Excel",
-            data=output_by_station_country,
+            data=outputs['station_country_excel'],
             file_name='kpi_promedio_por_estacion_y_pais.xlsx',
             mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
@@ -260,33 +192,14 @@ def main():
         # Incluir un nuevo gráfico
         st.header("KPI Promedio por País")
 
-        # KPI promedio por país y año
-        kpi_by_country = filtered_df.pivot_table(values='KPI', index='Pais', columns='AÑO', aggfunc='mean').fillna(0)
-
-        # Conteo de estaciones por país y año
-        station_count_by_country = filtered_df.pivot_table(values='KPI', index='Pais', columns='AÑO', aggfunc='count').fillna(0)
-        station_count_by_country.columns = [f"{col}_count" for col in station_count_by_country.columns]
-
-        # Combinar el KPI promedio y el conteo de estaciones
-        kpi_by_country = pd.concat([kpi_by_country, station_count_by_country], axis=1)
-        kpi_by_country = kpi_by_country.round(2)
-
-        
-        # Convertir el DataFrame pivotado a un archivo de Excel para la descarga
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            kpi_pivot_df.to_excel(writer, index=False)
-            # No es necesario llamar a writer.save() aquí, se guarda automáticamente al finalizar el bloque with
-        output.seek(0)  # Regresamos al principio del stream para que streamlit pueda leer el contenido
-
         # Muestra el DataFrame en la aplicación
         st.write("Datos Resumidos:")
-        st.dataframe(kpi_by_country)
+        selectable_dataframe(outputs['country_year_summary'], 'tabla_pais_año', 'Pais', 'AÑO')
 
         # Botón de descarga en Streamlit
         st.download_button(
             label="Descargar KPI promedio por país y año como Excel",
-            data=output,
+            data=outputs['country_year_excel'],
             file_name='kpi_promedio_por_pais_y_año.xlsx',
             mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
@@ -294,37 +207,19 @@ def main():
     # Crear la tabla pivotada con estaciones como filas y años como columnas
     st.header("KPI Promedio por Estación y Año")
 
-    # KPI promedio por estación y año
-    kpi_pivot_df_by_station_year = filtered_df.pivot_table(values='KPI', index='Tipo_KPI', columns='AÑO', aggfunc='mean')
-
-    # Conteo de estaciones por tipo de estación y año
-    station_count_by_station_year = filtered_df.pivot_table(values='KPI', index='Tipo_KPI', columns='AÑO', aggfunc='count').fillna(0)
-    station_count_by_station_year.columns = [f"{col}_count" for col in station_count_by_station_year.columns]
-
-    # Combinar el KPI promedio y el conteo de estaciones
-    kpi_pivot_df_by_station_year = pd.concat([kpi_pivot_df_by_station_year, station_count_by_station_year], axis=1)
-
-    # Redondear todos los valores numéricos a dos decimales
-    kpi_pivot_df_by_station_year = kpi_pivot_df_by_station_year.round(2)
-
-    # Opción para reemplazar los valores None/NaN con un string vacío
-    kpi_pivot_df_by_station_year = kpi_pivot_df_by_station_year.fillna('')
     # Muestra el DataFrame en la aplicación
-    st.dataframe(kpi_pivot_df_by_station_year)
-
-    # Convertir el DataFrame pivotado a un archivo de Excel para la descarga
-    output_by_station_year = io.BytesIO()
-    with pd.ExcelWriter(output_by_station_year, engine='openpyxl') as writer:
-        kpi_pivot_df_by_station_year.to_excel(writer, index=True)
-    output_by_station_year.seek(0)  # Regresamos al principio del stream para que streamlit pueda leer el contenido
+    selectable_dataframe(outputs['station_year_table'], 'tabla_estacion_año', 'Tipo_KPI', 'AÑO')
 
     # Botón de descarga en Streamlit
     st.download_button(
         label="Descargar KPI promedio por estación y año como Excel",
-        data=output_by_station_year,
+        data=outputs['station_year_excel'],
         file_name='kpi_promedio_por_estacion_y_año.xlsx',
         mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     )
 
+    # Detalle de los proyectos (IDEtapa) que componen cada celda de las tablas
+    show_drilldown(build_group_index(data_version, variant, data), filtered_df, selected_years)
+
 if __name__ == "__main__":
     main()
@@ -26,7 +26,43 @@ def data_frame_demo():
     def get_UN_data():
         AWS_BUCKET_URL = "https://streamlit-demo-data.s3-us-west-2.amazonaws.com"
         df = pd.read_csv(AWS_BUCKET_URL + "/agri.csv.gz")
-        return df.set_index("Region")
+        # Scale to billions once instead of on every selection.
+        return df.set_index("Region") / 1000000.0
+
+    @st.cache_resource
+    def get_long_UN_data():
+        # Long format sorted by Region, so each country is one contiguous block.
+        # Kept as a shared resource: slicing it is zero-copy and it is never modified.
+        df = get_UN_data()
+        long_df = df.reset_index().melt(
+            id_vars=["Region"],
+            var_name="year",
+            value_name="Gross Agricultural Product ($B)",
+        )
+        return long_df.set_index("Region").sort_index(kind="stable")
+
+    @st.cache_resource
+    def get_chart_template():
+        # Chart encoding without data; the rows of each country are added below.
+        chart = (
+            alt.Chart(alt.Data(values=[]))
+            .mark_area(opacity=0.3)
+            .encode(
+                x="year:T",
+                y=alt.Y("Gross Agricultural Product ($B):Q", stack=None),
+                color="Region:N",
+            )
+        )
+        return chart.to_dict()
+
+    @st.cache_data(max_entries=64)
+    def get_country_rows(country):
+        # Chart rows of one country, so adding a country only builds its own rows.
+        return get_long_UN_data().loc[country:country].reset_index().to_dict("records")
+
+    def get_chart_spec(countries):
+        rows = [row for country in countries for row in get_country_rows(country)]
+        return {**get_chart_template(), "data": {"values": rows}}
 
     try:
         df = get_UN_data()
@@ -37,23 +73,9 @@ def data_frame_demo():
             st.error("Please select at least one country.")
         else:
             data = df.loc[countries]
-            data /= 1000000.0
             st.write("### Gross Agricultural Production ($B)", data.sort_index())
 
-            data = data.T.reset_index()
-            data = pd.melt(data, id_vars=["index"]).rename(
-                columns={"index": "year", "value": "Gross Agricultural Product ($B)"}
-            )
-            chart = (
-                alt.Chart(data)
-                .mark_area(opacity=0.3)
-                .encode(
-                    x="year:T",
-                    y=alt.Y("Gross Agricultural Product ($B):Q", stack=None),
-                    color="Region:N",
-                )
-            )
-            st.altair_chart(chart, use_container_width=True)
+            st.vega_lite_chart(get_chart_spec(countries), use_container_width=True)
     except URLError as e:
         st.error(
             """
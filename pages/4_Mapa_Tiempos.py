@@ -0,0 +1,104 @@
+import streamlit as st
+import pandas as pd
+import pydeck as pdk
+from outliers import exclude_outliers
+from map_layers import load_country_shapes, country_attributes, attach_attributes
+from shared_cache import load_shared_csv
+
+# Configuración inicial de la página
+st.set_page_config(page_title="Mapa de Tiempos de Respuesta", page_icon="🌎")
+
+# URLs de las hojas de Google Sheets
+data_url= "https://docs.google.com/spreadsheets/d/e/2PACX-1vQE1hYnTcdOn72tyNOEQ_6L97XtPx8Hsd1ep-wxi9rLaJJm0KWTGb7JonuPzO-EyQH8g2UZ9rwK0CuF/pub?gid=1428049919&single=true&output=csv"
+
+# Estadísticos disponibles para colorear el mapa
+STATISTICS = {
+    "Promedio": 'mean',
+    "Mediana (P50)": 0.5,
+    "Percentil 90": 0.9,
+}
+
+# Función para cargar los datos desde la URL (descarga compartida entre procesos)
+def load_data_from_url(url):
+    try:
+        return load_shared_csv(url)
+    except Exception as e:
+        st.error("Error al cargar los datos: " + str(e))
+        return None
+
+# Las geometrías se leen y simplifican una sola vez por proceso
+@st.cache_resource
+def cached_country_shapes():
+    return load_country_shapes()
+
+# Aplicación Streamlit
+def main():
+    st.title("Mapa de Tiempos de Respuesta")
+
+    # Carga los datos
+    data = load_data_from_url(data_url)
+
+    if data is not None:
+        # Filtros en la barra lateral
+        years = data['AÑO'].dropna().astype(int)
+        min_year, max_year = int(years.min()), int(years.max())
+        selected_years = st.sidebar.slider('Selecciona el rango de años:', min_year, max_year, (min_year, max_year))
+
+        all_stations = ['Todas'] + list(data['Tipo_KPI'].dropna().unique())
+        selected_station = st.sidebar.selectbox('Selecciona una Estación', all_stations)
+
+        statistic_label = st.sidebar.radio('Estadístico', list(STATISTICS))
+        extruded = st.sidebar.checkbox('Mostrar como columnas 3D', False)
+
+        if st.sidebar.checkbox('Excluir valores atípicos de los cálculos', value=False):
+            data = exclude_outliers(data)
+
+        # Aplicar filtros al DataFrame
+        filtered_df = data[
+            (data['AÑO'] >= selected_years[0]) &
+            (data['AÑO'] <= selected_years[1])
+        ]
+        if selected_station != 'Todas':
+            filtered_df = filtered_df[filtered_df['Tipo_KPI'] == selected_station]
+
+        # Sólo se recalculan los atributos; las geometrías vienen de la caché
+        countries, features = cached_country_shapes()
+        attributes = country_attributes(filtered_df, countries, STATISTICS[statistic_label])
+
+        layer = pdk.Layer(
+            "GeoJsonLayer",
+            data=attach_attributes(features, attributes),
+            pickable=True,
+            stroked=True,
+            filled=True,
+            extruded=extruded,
+            get_fill_color="properties.color",
+            get_line_color=[255, 255, 255],
+            line_width_min_pixels=1,
+            get_elevation="properties.altura * 800000 + 20000",
+        )
+
+        st.pydeck_chart(
+            pdk.Deck(
+                map_style=None,
+                initial_view_state={
+                    "latitude": -22,
+                    "longitude": -58,
+                    "zoom": 2.6,
+                    "pitch": 45 if extruded else 0,
+                },
+                layers=[layer],
+                tooltip={"html": "<b>{Pais}</b><br/>KPI: {KPI} meses<br/>Estaciones: {Estaciones}"},
+            )
+        )
+
+        # Tabla con los mismos valores que colorean el mapa
+        summary = pd.DataFrame({
+            'Pais': countries,
+            statistic_label: attributes['value'].round(2),
+            'Estaciones': attributes['count'],
+        })
+        st.dataframe(summary, hide_index=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import streamlit as st
+from shared_cache import load_shared_csv
+from reports import submit_report, report_jobs, bundle_reports
+
+# Configuración inicial de la página
+st.set_page_config(page_title="Reportes por País", page_icon="📄")
+
+# URLs de las hojas de Google Sheets
+data_url= "https://docs.google.com/spreadsheets/d/e/2PACX-1vQE1hYnTcdOn72tyNOEQ_6L97XtPx8Hsd1ep-wxi9rLaJJm0KWTGb7JonuPzO-EyQH8g2UZ9rwK0CuF/pub?gid=1428049919&single=true&output=csv"
+
+# Cada cuántos segundos se actualiza el progreso mientras hay reportes en curso
+REFRESH_SECONDS = 1
+
+# Función para cargar los datos desde la URL (descarga compartida entre procesos)
+def load_data_from_url(url):
+    try:
+        return load_shared_csv(url)
+    except Exception as e:
+        st.error("Error al cargar los datos: " + str(e))
+        return None
+
+# Progreso y descarga de cada reporte. Corre como fragmento: al actualizar el avance no se vuelve
+# a ejecutar la página completa.
+def show_report_jobs(data_version, exclude_flagged, refreshing):
+    jobs = report_jobs(data_version, exclude_flagged)
+    for job in jobs:
+        st.progress(job.progress, text=f"{job.country}: {job.status}")
+        if job.status == 'Listo':
+            st.download_button(
+                label=f"Descargar reporte de {job.country}",
+                data=job.artifact,
+                file_name=f'reporte_{job.country}.zip',
+                mime='application/zip',
+                key=f'download_{job.country}'
+            )
+        elif job.status == 'Error':
+            st.error(f"Error al generar el reporte de {job.country}: {job.error}")
+
+    finished = [job for job in jobs if job.status == 'Listo']
+    if len(finished) > 1:
+        st.download_button(
+            label="Descargar todos los reportes",
+            data=bundle_reports(finished),
+            file_name='reportes_por_pais.zip',
+            mime='application/zip'
+        )
+
+    # Cuando termina el último reporte, una ejecución completa de la página detiene la actualización
+    if refreshing and all(job.finished for job in jobs):
+        st.rerun()
+
+# Aplicación Streamlit
+def main():
+    st.title("Reportes por País")
+    st.write("Cada reporte incluye todas las tablas de Eficiencia Operativa en un libro de Excel "
+             "y los gráficos en PNG y PDF. Se generan en segundo plano: se puede seguir usando la aplicación.")
+
+    # Carga los datos
+    data = load_data_from_url(data_url)
+
+    if data is not None:
+        data_version = data.attrs['version']
+
+        exclude_flagged = st.checkbox('Excluir valores atípicos de los cálculos', value=False)
+        countries = list(data['Pais'].dropna().unique())
+
+        # Pedidos de reportes: uno por país o todos a la vez (se generan en paralelo)
+        col1, col2 = st.columns(2)
+        selected_country = col1.selectbox('Selecciona un País', countries)
+        if col1.button('Generar reporte'):
+            submit_report(data, data_version, selected_country, exclude_flagged)
+        if col2.button('Generar reportes de todos los países'):
+            for country in countries:
+                submit_report(data, data_version, country, exclude_flagged)
+
+        # Progreso y descarga de los reportes; se actualiza solo mientras haya reportes en curso
+        refreshing = any(not job.finished for job in report_jobs(data_version, exclude_flagged))
+        st.fragment(show_report_jobs, run_every=REFRESH_SECONDS if refreshing else None)(
+            data_version, exclude_flagged, refreshing
+        )
+
+if __name__ == "__main__":
+    main()
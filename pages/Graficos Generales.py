@@ -1,8 +1,12 @@
 import streamlit as st
-import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
-import io
+from outliers import exclude_outliers
+from drilldown import build_group_index, selectable_dataframe, show_drilldown
+from query_backend import data_variant, get_query_backend
+from shared_cache import load_shared_csv, SharedCacheBackend
+from kpi_tables import apply_filters, filter_key
+from dashboard_spec import GRAFICOS_PLAN
 
 # Configuración inicial de la página
 st.set_page_config(page_title="Análisis de Eficiencia Operativa", page_icon="📊")
@@ -10,10 +14,10 @@ st.set_page_config(page_title="Análisis de Eficiencia Operativa", page_icon="
 # URLs de las hojas de Google Sheets
 data_url= "https://docs.google.com/spreadsheets/d/e/2PACX-1vQE1hYnTcdOn72tyNOEQ_6L97XtPx8Hsd1ep-wxi9rLaJJm0KWTGb7JonuPzO-EyQH8g2UZ9rwK0CuF/pub?gid=1428049919&single=true&output=csv"
 
-# Función para cargar los datos desde la URL
+# Función para cargar los datos desde la URL (descarga compartida entre procesos)
 def load_data_from_url(url):
     try:
-        return pd.read_csv(url, header=0)
+        return load_shared_csv(url)
     except Exception as e:
         st.error("Error al cargar los datos: " + str(e))
         return None
@@ -26,6 +30,9 @@ def main():
     data = load_data_from_url(data_url)
 
     if data is not None:
+        # Versión de los datos cargados; identifica los resultados en el caché compartido
+        data_version = data.attrs['version']
+
         st.dataframe(data)
 
         # Configurar el estilo de Seaborn para los gráficos
@@ -53,19 +60,17 @@ def main():
         all_countries = ['Todos'] + list(data['Pais'].dropna().unique())
         selected_countries = st.multiselect('Selecciona Países', all_countries, default='Todos')
 
-        # Aplicar filtros al DataFrame
-        filtered_df = data[
-            (data['AÑO'] >= selected_years[0]) &
-            (data['AÑO'] <= selected_years[1])
-        ]
+        # Opción para excluir los valores atípicos de todos los cálculos
+        exclude_flagged = st.checkbox('Excluir valores atípicos de los cálculos', value=False)
+        outlier_rows = data[data['Outlier']]
+        if exclude_flagged:
+            data = exclude_outliers(data)
 
-        # Filtro por estación con opción "Todas"
-        if selected_station != 'Todas':
-            filtered_df = filtered_df[filtered_df['Tipo_KPI'] == selected_station]
+        # Parámetros que identifican los resultados en el caché compartido
+        filter_params = filter_key(selected_years, selected_station, selected_countries, exclude_flagged)
 
-        # Filtro por país con opción "Todos"
-        if 'Todos' not in selected_countries:
-            filtered_df = filtered_df[filtered_df['Pais'].isin(selected_countries)]
+        # Aplicar filtros al DataFrame (una sola vez: los gráficos y el detalle usan el mismo resultado)
+        filtered_df = apply_filters(data, selected_years, selected_station, selected_countries)
 
         # Incluir gráficos
         st.header("         Análisis de la Eficiencia Operativa")
@@ -82,6 +87,10 @@ def main():
         col2.metric("Proyectos", unique_operation_count)
         col3.metric("Total de Estaciones", total_stations)
 
+        # Listado de los valores atípicos detectados en la carga de datos
+        with st.expander(f"Valores Atípicos Detectados ({len(outlier_rows)})"):
+            st.dataframe(outlier_rows[['IDEtapa', 'Pais', 'Tipo_KPI', 'AÑO', 'KPI', 'Puntaje_Robusto', 'Motivo_Outlier']])
+
        
         # Función auxiliar para agregar etiquetas de valor en los gráficos de barra
         def add_value_labels(ax, is_horizontal=False):
@@ -142,22 +151,13 @@ def main():
             "PrimerDesembolso": "#E30613"
         }
 
-        # Aplicar filtros al DataFrame
-        filtered_df = data[
-            (data['AÑO'] >= selected_years[0]) &
-            (data['AÑO'] <= selected_years[1])
-        ]
+        # Tablas, datos de los gráficos y archivos de Excel de la especificación de la página
+        variant = data_variant(exclude_flagged)
+        backend = SharedCacheBackend(get_query_backend(data_version, variant, data), data_version, variant)
+        outputs = GRAFICOS_PLAN.run(backend, data_version, filter_params, selected_years, selected_station, selected_countries)
 
-        if selected_station != 'Todas':
-            filtered_df = filtered_df[filtered_df['Tipo_KPI'] == selected_station]
-
-        # Modificado para manejar múltiples selecciones de países
-        if 'Todos' not in selected_countries:
-            filtered_df = filtered_df[filtered_df['Pais'].isin(selected_countries)]
-    
         # Preparación de datos para el gráfico de barras apiladas por estaciones
-        kpi_by_year_station = filtered_df.pivot_table(values='KPI', index='AÑO', columns='Tipo_KPI', aggfunc='mean').fillna(0)
-        kpi_by_year_station.index = kpi_by_year_station.index.map(int)
+        kpi_by_year_station = outputs['year_station_chart']
 
         # Creamos una lista de colores basada en los países presentes en el DataFrame y en el orden correcto
         # Crear una lista de colores basada en las estaciones presentes en el DataFrame
@@ -188,32 +188,15 @@ def main():
 
         filtered_df['AÑO'] = filtered_df['AÑO'].astype(int)     
 
-        # Pivotear el DataFrame para obtener el KPI promedio por país y año
-        kpi_pivot_df = filtered_df.pivot_table(values='KPI', index='Pais', columns='AÑO', aggfunc='mean')
-
-        # Redondear todos los valores numéricos a dos decimales
-        kpi_pivot_df = kpi_pivot_df.round(2)
-
-        # Opción para reemplazar los valores None/NaN con un string vacío
-        kpi_pivot_df = kpi_pivot_df.fillna('')
-
-        # Convertir las etiquetas de las columnas a enteros (los años)
-        kpi_pivot_df.columns = kpi_pivot_df.columns.astype(int)
+        # KPI promedio por país y año, redondeado y con los años como columnas enteras
+        kpi_pivot_df = outputs['country_year_table']
 
-        # Resetear el índice para llevar 'ESTACIONES' a una columna
-        kpi_pivot_df.reset_index(inplace=True)
-
-
-        # Convertir el DataFrame pivotado a un archivo de Excel para la descarga
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            kpi_pivot_df.to_excel(writer, index=False)
-            # No es necesario llamar a writer.save() aquí, se guarda automáticamente al finalizar el bloque with
-        output.seek(0)  # Regresamos al principio del stream para que streamlit pueda leer el contenido
+        # Archivo de Excel para la descarga
+        output = outputs['country_year_excel']
 
         # Muestra el DataFrame en la aplicación
         st.write("Datos Resumidos:")
-        st.dataframe(kpi_pivot_df)
+        selectable_dataframe(kpi_pivot_df, 'tabla_pais_año', 'Pais', 'AÑO')
 
         # Botón de descarga en Streamlit
         st.download_button(
@@ -227,7 +210,7 @@ def main():
     st.header("KPI Promedio por País")
 
     # Preparar datos para el gráfico por país
-    kpi_by_country = filtered_df.pivot_table(values='KPI', index='Pais', columns='AÑO', aggfunc='mean').fillna(0)
+    kpi_by_country = outputs['country_year_chart']
     kpi_by_country.index = kpi_by_country.index.map(str)
 
     # Crear una lista de colores basada en los países presentes en el DataFrame
@@ -257,23 +240,14 @@ def main():
     # Crear la tabla pivotada con estaciones como filas y países como columnas
     st.header("KPI Promedio por Estación y País")
 
-    # Pivotear el DataFrame para obtener el KPI promedio por estación (Tipo_KPI) y país
-    kpi_pivot_df_by_station_country = filtered_df.pivot_table(values='KPI', index='Tipo_KPI', columns='Pais', aggfunc='mean')
-
-    # Redondear todos los valores numéricos a dos decimales
-    kpi_pivot_df_by_station_country = kpi_pivot_df_by_station_country.round(2)
-
-    # Opción para reemplazar los valores None/NaN con un string vacío
-    kpi_pivot_df_by_station_country = kpi_pivot_df_by_station_country.fillna('')
+    # KPI promedio por estación (Tipo_KPI) y país, redondeado a dos decimales
+    kpi_pivot_df_by_station_country = outputs['station_country_table']
 
     # Muestra el DataFrame en la aplicación
-    st.dataframe(kpi_pivot_df_by_station_country)
+    selectable_dataframe(kpi_pivot_df_by_station_country, 'tabla_estacion_pais', 'Tipo_KPI', 'Pais')
 
-    # Convertir el DataFrame pivotado a un archivo de Excel para la descarga
-    output_by_station_country = io.BytesIO()
-    with pd.ExcelWriter(output_by_station_country, engine='openpyxl') as writer:
-        kpi_pivot_df_by_station_country.to_excel(writer, index=True)
-    output_by_station_country.seek(0)  # Regresamos al principio del stream para que streamlit pueda leer el contenido
+    # Archivo de Excel para la descarga
+    output_by_station_country = outputs['station_country_excel']
 
     # Botón de descarga en Streamlit
     st.download_button(
@@ -288,7 +262,7 @@ def main():
 
     # Preparar los datos para el gráfico
     # Primero, creamos un DataFrame con los KPI promedios por país y estación
-    kpi_avg_by_country_station = filtered_df.groupby(['Pais', 'Tipo_KPI'])['KPI'].mean().unstack(fill_value=0)
+    kpi_avg_by_country_station = outputs['country_station_chart']
 
     # Crear el gráfico de barras
     fig, ax = plt.subplots(figsize=(10, 6))
@@ -314,23 +288,14 @@ def main():
     # Crear la tabla pivotada con estaciones como filas y años como columnas
     st.header("KPI Promedio por Estación y Año")
 
-    # Pivotear el DataFrame para obtener el KPI promedio por estación (Tipo_KPI) y año
-    kpi_pivot_df_by_station_year = filtered_df.pivot_table(values='KPI', index='Tipo_KPI', columns='AÑO', aggfunc='mean')
-
-    # Redondear todos los valores numéricos a dos decimales
-    kpi_pivot_df_by_station_year = kpi_pivot_df_by_station_year.round(2)
-
-    # Opción para reemplazar los valores None/NaN con un string vacío
-    kpi_pivot_df_by_station_year = kpi_pivot_df_by_station_year.fillna('')
+    # KPI promedio por estación (Tipo_KPI) y año, redondeado a dos decimales
+    kpi_pivot_df_by_station_year = outputs['station_year_table']
 
     # Muestra el DataFrame en la aplicación
-    st.dataframe(kpi_pivot_df_by_station_year)
+    selectable_dataframe(kpi_pivot_df_by_station_year, 'tabla_estacion_año', 'Tipo_KPI', 'AÑO')
 
-    # Convertir el DataFrame pivotado a un archivo de Excel para la descarga
-    output_by_station_year = io.BytesIO()
-    with pd.ExcelWriter(output_by_station_year, engine='openpyxl') as writer:
-        kpi_pivot_df_by_station_year.to_excel(writer, index=True)
-    output_by_station_year.seek(0)  # Regresamos al principio del stream para que streamlit pueda leer el contenido
+    # Archivo de Excel para la descarga
+    output_by_station_year = outputs['station_year_excel']
 
     # Botón de descarga en Streamlit
     st.download_button(
@@ -340,5 +305,8 @@ def main():
         mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     )
 
+    # Detalle de los proyectos (IDEtapa) que componen cada celda de las tablas
+    show_drilldown(build_group_index(data_version, variant, data), filtered_df, selected_years)
+
 if __name__ == "__main__":
     main()
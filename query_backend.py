@@ -0,0 +1,140 @@
+import pyarrow as pa
+import streamlit as st
+
+try:
+    import duckdb
+except ImportError:  # DuckDB es opcional; sin él se usa el backend de pandas
+    duckdb = None
+
+# Tablas de la aplicación: filas y columnas de cada tabla pivotada
+QUERY_TABLES = {
+    'estacion_pais': ('Tipo_KPI', 'Pais'),
+    'pais_año': ('Pais', 'AÑO'),
+    'estacion_año': ('Tipo_KPI', 'AÑO'),
+}
+
+# Columnas que se cargan en el backend
+QUERY_COLUMNS = ['IDEtapa', 'Pais', 'Tipo_KPI', 'AÑO', 'KPI']
+
+# Columnas por las que se puede agrupar
+GROUP_COLUMNS = ('Pais', 'Tipo_KPI', 'AÑO')
+
+
+def _check_group_columns(row, column):
+    for name in (row, column):
+        if name not in GROUP_COLUMNS:
+            raise ValueError(f"No se puede agrupar por la columna: {name}")
+
+
+# Filtros de la aplicación con el mismo significado que los widgets ('Todas' y 'Todos')
+def normalize_filters(selected_years, selected_station='Todas', selected_countries=('Todos',)):
+    station = None if selected_station == 'Todas' else selected_station
+    countries = None if 'Todos' in selected_countries else list(selected_countries)
+    return int(selected_years[0]), int(selected_years[1]), station, countries
+
+
+class PandasBackend:
+    """Backend de referencia: groupby de pandas sobre el DataFrame en memoria."""
+
+    name = 'pandas'
+
+    def __init__(self, data):
+        self.data = data[QUERY_COLUMNS].dropna(subset=['Pais', 'Tipo_KPI', 'AÑO']).copy()
+        self.data['AÑO'] = self.data['AÑO'].astype(int)
+
+    def aggregate(self, table, selected_years, selected_station='Todas', selected_countries=('Todos',)):
+        return self.group(*QUERY_TABLES[table], selected_years, selected_station, selected_countries)
+
+    # KPI promedio, conteo de KPI y filas por cualquier par de columnas de agrupación
+    def group(self, row, column, selected_years, selected_station='Todas', selected_countries=('Todos',)):
+        _check_group_columns(row, column)
+        min_year, max_year, station, countries = normalize_filters(selected_years, selected_station, selected_countries)
+
+        df = self.data
+        mask = (df['AÑO'] >= min_year) & (df['AÑO'] <= max_year)
+        if station is not None:
+            mask &= df['Tipo_KPI'] == station
+        if countries is not None:
+            mask &= df['Pais'].isin(countries)
+
+        result = df[mask].groupby([row, column], sort=True)['KPI'].agg(KPI='mean', Conteo='count', Filas='size')
+        return pa.Table.from_pandas(result.reset_index(), preserve_index=False)
+
+
+class DuckDBBackend:
+    """Backend SQL embebido: los datos se cargan una sola vez en una tabla columnar de DuckDB."""
+
+    name = 'duckdb'
+
+    def __init__(self, data):
+        source = data[QUERY_COLUMNS]
+        self.connection = duckdb.connect()
+        self.connection.register('source', source)
+        self.connection.execute(
+            'CREATE TABLE kpi AS SELECT IDEtapa, Pais, Tipo_KPI, CAST("AÑO" AS INTEGER) AS "AÑO", KPI '
+            'FROM source WHERE Pais IS NOT NULL AND Tipo_KPI IS NOT NULL AND "AÑO" IS NOT NULL'
+        )
+        self.connection.unregister('source')
+
+    def aggregate(self, table, selected_years, selected_station='Todas', selected_countries=('Todos',)):
+        return self.group(*QUERY_TABLES[table], selected_years, selected_station, selected_countries)
+
+    def group(self, row, column, selected_years, selected_station='Todas', selected_countries=('Todos',)):
+        _check_group_columns(row, column)
+        min_year, max_year, station, countries = normalize_filters(selected_years, selected_station, selected_countries)
+
+        # Los nombres de columna se validan contra GROUP_COLUMNS; los valores de los filtros van como parámetros
+        query = f'''
+            SELECT "{row}", "{column}", avg(KPI) AS KPI, count(KPI) AS Conteo, count(*) AS Filas
+            FROM kpi
+            WHERE "AÑO" BETWEEN ? AND ?
+              AND (CAST(? AS VARCHAR) IS NULL OR Tipo_KPI = ?)
+              AND (CAST(? AS BOOLEAN) OR Pais IN (SELECT unnest(CAST(? AS VARCHAR[]))))
+            GROUP BY "{row}", "{column}"
+            ORDER BY "{row}", "{column}"
+        '''
+        # Un cursor por consulta: la conexión de DuckDB no se comparte entre hilos
+        result = self.connection.cursor().execute(
+            query, [min_year, max_year, station, station, countries is None, countries or []]
+        )
+        to_arrow = getattr(result, 'to_arrow_table', None) or result.fetch_arrow_table
+        return to_arrow()
+
+
+# Devuelve el backend pedido o el mejor disponible; pandas siempre está disponible
+def create_backend(data, name=None):
+    if name is None:
+        name = 'duckdb' if duckdb is not None else 'pandas'
+    if name == 'duckdb':
+        if duckdb is None:
+            raise ImportError("El backend 'duckdb' requiere instalar el paquete duckdb")
+        return DuckDBBackend(data)
+    if name == 'pandas':
+        return PandasBackend(data)
+    raise ValueError(f"Backend desconocido: {name}")
+
+
+# Variante de los datos según se excluyan o no los valores atípicos
+def data_variant(exclude_flagged):
+    return 'sin_atipicos' if exclude_flagged else 'todos'
+
+
+# Un backend por versión de los datos, variante y motor, compartido en el proceso por las páginas,
+# los reportes y el precalentado: los datos se cargan una sola vez. El DataFrame no se usa como
+# clave: se identifica por la versión, sin recorrerlo en cada ejecución.
+@st.cache_resource(max_entries=6)
+def get_query_backend(data_version, variant, _data, name=None):
+    return create_backend(_data, name)
+
+
+# Convierte el resultado Arrow en una tabla pivotada (filas x columnas) como las de la aplicación
+def to_pivot(result, table, values='KPI'):
+    return pivot_result(result, *QUERY_TABLES[table], values=values)
+
+
+# Igual que to_pivot pero para cualquier par de columnas de agrupación
+def pivot_result(result, row, column, values='KPI'):
+    df = result.to_pandas()
+    pivot = df.pivot(index=row, columns=column, values=values)
+    pivot.columns.name = column
+    return pivot
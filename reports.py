@@ -0,0 +1,224 @@
+import io
+import os
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from matplotlib.figure import Figure
+
+from kpi_tables import apply_filters, efficiency_outputs
+from outliers import exclude_outliers
+from query_backend import data_variant, get_query_backend, to_pivot
+from shared_cache import SharedCacheBackend, get_shared_cache
+
+# Hilos para generar reportes (uno por país) y para dibujar los gráficos de cada reporte
+REPORT_WORKERS = int(os.environ.get('KPI_REPORT_WORKERS', 5))
+CHART_WORKERS = int(os.environ.get('KPI_CHART_WORKERS', os.cpu_count() or 2))
+
+_report_pool = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix='kpi-report')
+_chart_pool = ThreadPoolExecutor(max_workers=CHART_WORKERS, thread_name_prefix='kpi-chart')
+
+# Paletas de colores de la aplicación
+country_colors = {
+    "Argentina": "#36A9E1",
+    "Bolivia": "#F39200",
+    "Brasil": "#009640",
+    "Paraguay": "#E30613",
+    "Uruguay": "#27348B"
+}
+station_colors = {
+    "Vigencia": "#36A9E1",
+    "Aprobación": "#F39200",
+    "Elegibilidad": "#009640",
+    "PrimerDesembolso": "#E30613"
+}
+
+
+class ReportJob:
+    """Estado de la generación del reporte de un país."""
+
+    def __init__(self, country, total_steps):
+        self.country = country
+        self.total_steps = total_steps
+        self.done_steps = 0
+        self.status = 'En cola'
+        self.artifact = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    @property
+    def progress(self):
+        return self.done_steps / self.total_steps
+
+    @property
+    def finished(self):
+        return self.status in ('Listo', 'Error')
+
+    def step(self, status='Generando'):
+        with self._lock:
+            self.done_steps += 1
+            self.status = status
+
+
+# Los gráficos usan Figure directamente (sin pyplot) para poder dibujarse en paralelo
+def _figure_bytes(fig, fmt):
+    output = io.BytesIO()
+    fig.savefig(output, format=fmt, bbox_inches='tight')
+    return output.getvalue()
+
+
+def _render_chart(draw, *args):
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    draw(ax, *args)
+    return {'png': _figure_bytes(fig, 'png'), 'pdf': _figure_bytes(fig, 'pdf')}
+
+
+# Tiempo promedio por año y estaciones (barras apiladas)
+def _draw_year_station(ax, kpi_by_year_station):
+    colors = [station_colors.get(station, "#333333") for station in kpi_by_year_station.columns]
+    kpi_by_year_station.plot(kind='bar', stacked=True, color=colors, ax=ax)
+    ax.set_title('Tiempo Promedio por Año y Estaciones')
+    ax.set_ylabel('KPI Promedio')
+    ax.set_xlabel('Año')
+    ax.legend(title='Estación', bbox_to_anchor=(1.05, 1), loc='upper left')
+
+
+# Eficiencia en tiempos de respuesta (conteo por productividad)
+def _draw_productivity(ax, productivity_count):
+    ax.barh(productivity_count.index.astype(str), productivity_count.values, color='#36A9E1')
+    for y, value in enumerate(productivity_count.values):
+        ax.text(value, y, f"{int(value)}", ha='left', va='center')
+    ax.set_title('Eficiencia en Tiempos de Respuesta')
+
+
+# KPI promedio por estación
+def _draw_station(ax, kpi_by_station, color):
+    ax.bar(kpi_by_station.index.astype(str), kpi_by_station.values, color=color)
+    ax.bar_label(ax.containers[0], fmt='%.2f')
+    ax.set_title('KPI Promedio por Estación')
+    ax.set_ylabel('KPI Promedio')
+
+
+# Todas las tablas de la página en un único libro de Excel, una hoja por tabla
+def _workbook_bytes(outputs):
+    metrics = pd.DataFrame([outputs['metrics']]).rename(columns={
+        'average_kpi': 'Tiempo Promedio en Meses',
+        'unique_operation_count': 'Proyectos',
+        'total_stations': 'Total de Estaciones',
+    })
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        metrics.to_excel(writer, sheet_name='Resumen', index=False)
+        outputs['station_country_table'].to_excel(writer, sheet_name='Estacion_Pais', index=True)
+        outputs['country_year_table'].to_excel(writer, sheet_name='Pais_Año', index=False)
+        outputs['country_year_summary'].to_excel(writer, sheet_name='Pais_Año_Conteo', index=True)
+        outputs['station_year_table'].to_excel(writer, sheet_name='Estacion_Año', index=True)
+    return output.getvalue()
+
+
+# Pasos del reporte: tablas, libro de Excel, tres gráficos y el archivo ZIP final
+REPORT_STEPS = 6
+
+
+def _build_report(job, backend, data, data_version, exclude_flagged):
+    country = job.country
+    job.status = 'Generando'
+    selected_years = (int(data['AÑO'].min()), int(data['AÑO'].max()))
+    outputs = efficiency_outputs(backend, data, data_version, selected_years, 'Todas', [country], exclude_flagged)
+    job.step()
+
+    # Los gráficos se dibujan en paralelo mientras se escribe el libro de Excel
+    kpi_by_year_station = outputs['year_station_chart']
+    productivity_count = apply_filters(data, selected_years, 'Todas', [country])['Productividad'].value_counts().sort_values()
+    kpi_by_station = to_pivot(outputs['station_country'], 'estacion_pais').get(country, pd.Series(dtype=float)).dropna()
+    chart_jobs = {
+        'tiempo_por_año_y_estacion': (_draw_year_station, kpi_by_year_station),
+        'eficiencia_en_tiempos': (_draw_productivity, productivity_count),
+        'kpi_por_estacion': (_draw_station, kpi_by_station, country_colors.get(country, "#333333")),
+    }
+    chart_futures = {name: _chart_pool.submit(_render_chart, *args) for name, args in chart_jobs.items()}
+
+    workbook = _workbook_bytes(outputs)
+    job.step()
+
+    charts = {}
+    for name, future in chart_futures.items():
+        charts[name] = future.result()
+        job.step()
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as bundle:
+        bundle.writestr(f'reporte_{country}.xlsx', workbook)
+        for name, rendered in charts.items():
+            bundle.writestr(f'graficos/{name}.png', rendered['png'])
+            bundle.writestr(f'graficos/{name}.pdf', rendered['pdf'])
+    job.step('Guardando')
+    return archive.getvalue()
+
+
+def _run_job(job, backend, data, data_version, exclude_flagged):
+    try:
+        # El reporte terminado queda en el caché compartido para todas las sesiones y procesos
+        job.artifact = get_shared_cache().get_or_compute(
+            'reporte', data_version, (job.country, bool(exclude_flagged)),
+            lambda: _build_report(job, backend, data, data_version, exclude_flagged)
+        )
+        job.done_steps = job.total_steps
+        job.status = 'Listo'
+    except Exception as e:
+        job.error = str(e)
+        job.status = 'Error'
+
+
+_jobs_lock = threading.Lock()
+_jobs = {}
+_backends = {}
+
+
+# Encola el reporte de un país; si ya existe un trabajo para la misma versión de los datos, lo reutiliza
+def submit_report(data, data_version, country, exclude_flagged=False):
+    key = (data_version, country, bool(exclude_flagged))
+    with _jobs_lock:
+        job = _jobs.get(key)
+        if job is not None and job.status != 'Error':
+            return job
+
+        # Los trabajos y backends de versiones anteriores de los datos ya no se usan
+        for stale in [k for k in _jobs if k[0] != data_version]:
+            del _jobs[stale]
+        for stale in [k for k in _backends if k[0] != data_version]:
+            del _backends[stale]
+
+        variant = data_variant(exclude_flagged)
+        if (data_version, variant) not in _backends:
+            variant_data = exclude_outliers(data) if exclude_flagged else data
+            # El mismo backend que usan las páginas; se puede leer desde varios hilos
+            _backends[(data_version, variant)] = (
+                variant_data,
+                SharedCacheBackend(get_query_backend(data_version, variant, variant_data), data_version, variant),
+            )
+        variant_data, backend = _backends[(data_version, variant)]
+
+        job = ReportJob(country, REPORT_STEPS)
+        _jobs[key] = job
+    _report_pool.submit(_run_job, job, backend, variant_data, data_version, exclude_flagged)
+    return job
+
+
+# Trabajos de la versión de datos indicada, en el orden en que se pidieron
+def report_jobs(data_version, exclude_flagged=False):
+    with _jobs_lock:
+        return [job for (version, _, exclude), job in _jobs.items()
+                if version == data_version and exclude == bool(exclude_flagged)]
+
+
+# Un solo ZIP con los reportes terminados de todos los países
+def bundle_reports(jobs):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_STORED) as bundle:
+        for job in jobs:
+            if job.status == 'Listo':
+                bundle.writestr(f'reporte_{job.country}.zip', job.artifact)
+    return archive.getvalue()
@@ -0,0 +1,284 @@
+import hashlib
+import io
+import os
+import pickle
+import sqlite3
+import stat
+import tempfile
+import threading
+import time
+import urllib.request
+
+import pandas as pd
+
+from outliers import flag_outliers
+from query_backend import QUERY_TABLES
+
+# Archivo SQLite compartido por todos los procesos de Streamlit del mismo usuario. Guarda pickles,
+# por eso vive en un directorio privado (0700) y no con un nombre fijo en el directorio temporal común.
+CACHE_DIR = os.path.join(tempfile.gettempdir(), f"tiempo_de_respuesta-{os.getuid() if hasattr(os, 'getuid') else 'usuario'}")
+CACHE_PATH = os.environ.get('KPI_CACHE_PATH', os.path.join(CACHE_DIR, 'cache.sqlite'))
+
+# Tamaño máximo del caché; al superarlo se eliminan las entradas menos usadas
+CACHE_MAX_BYTES = int(os.environ.get('KPI_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# Cada cuántos segundos se vuelve a descargar la hoja de cálculo
+DATA_REFRESH_SECONDS = int(os.environ.get('KPI_DATA_REFRESH_SECONDS', 600))
+
+# Tiempo máximo que un proceso reserva una clave mientras la calcula
+LEASE_SECONDS = 120
+
+# Precisión del último acceso de cada entrada: una lectura sólo escribe en el archivo si el acceso
+# guardado es más antiguo. Para el desalojo LRU alcanza con esta precisión.
+ACCESS_RESOLUTION_SECONDS = 60
+
+_MISSING = object()
+
+
+# Crea el directorio del caché sólo para el usuario actual y rechaza uno que otro usuario pueda modificar.
+# También lo usan las páginas que guardan archivos propios en CACHE_DIR.
+def ensure_private_dir(directory):
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode):
+        raise PermissionError(f"El directorio del caché no es un directorio: {directory}")
+    if hasattr(os, 'getuid') and (info.st_uid != os.getuid() or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)):
+        raise PermissionError(f"El directorio del caché puede ser modificado por otros usuarios: {directory}")
+
+
+class SharedCache:
+    """Caché de resultados en SQLite compartido entre procesos.
+
+    Las claves se forman con (espacio, versión de los datos, parámetros). SQLite se encarga
+    del bloqueo del archivo; además, una reserva por clave evita que varios procesos
+    calculen el mismo resultado al mismo tiempo.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        ensure_private_dir(os.path.dirname(os.path.abspath(path)))
+        with self._connection() as connection:
+            connection.executescript('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    namespace TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+                CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, expires REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+            ''')
+
+    # Una conexión por hilo: Streamlit atiende cada sesión en un hilo distinto
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def make_key(namespace, version, params):
+        digest = hashlib.sha1(repr(params).encode('utf-8')).hexdigest()
+        return f"{namespace}:{version}:{digest}"
+
+    def get(self, namespace, version, params):
+        key = self.make_key(namespace, version, params)
+        connection = self._connection()
+        row = connection.execute('SELECT value, last_access FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return _MISSING
+        now = time.time()
+        if now - row[1] > ACCESS_RESOLUTION_SECONDS:
+            connection.execute('UPDATE entries SET last_access = ? WHERE key = ?', (now, key))
+        return pickle.loads(row[0])
+
+    def contains(self, namespace, version, params):
+        key = self.make_key(namespace, version, params)
+        return self._connection().execute('SELECT 1 FROM entries WHERE key = ?', (key,)).fetchone() is not None
+
+    # Ejecuta una sentencia sobre el archivo del caché (para tablas auxiliares de otros módulos)
+    def execute(self, sql, params=()):
+        return self._connection().execute(sql, params)
+
+    def set(self, namespace, version, params, value):
+        key = self.make_key(namespace, version, params)
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute(
+                'INSERT OR REPLACE INTO entries (key, namespace, version, value, size, last_access) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, namespace, version, blob, len(blob), time.time())
+            )
+            # Desalojo LRU: se conservan las entradas más recientes hasta llenar el tamaño máximo
+            connection.execute('''
+                DELETE FROM entries WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key, SUM(size) OVER (ORDER BY last_access DESC, key) AS running
+                        FROM entries
+                    ) WHERE running > ?
+                )
+            ''', (self.max_bytes,))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+    def _acquire_lease(self, key):
+        now = time.time()
+        cursor = self._connection().execute(
+            'INSERT INTO leases (key, expires) VALUES (?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET expires = excluded.expires WHERE leases.expires < ?',
+            (key, now + LEASE_SECONDS, now)
+        )
+        return cursor.rowcount == 1
+
+    def _release_lease(self, key):
+        self._connection().execute('DELETE FROM leases WHERE key = ?', (key,))
+
+    # Devuelve el valor guardado o lo calcula una sola vez entre todos los procesos
+    def get_or_compute(self, namespace, version, params, compute):
+        key = self.make_key(namespace, version, params)
+        deadline = time.time() + LEASE_SECONDS
+        while True:
+            value = self.get(namespace, version, params)
+            if value is not _MISSING:
+                return value
+            if self._acquire_lease(key):
+                break
+            # Otro proceso lo está calculando: esperar su resultado
+            if time.time() > deadline:
+                return compute()
+            time.sleep(0.05)
+
+        try:
+            value = compute()
+            self.set(namespace, version, params, value)
+        finally:
+            self._release_lease(key)
+        return value
+
+    def get_meta(self, name):
+        row = self._connection().execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return None if row is None else row[0]
+
+    def set_meta(self, name, value):
+        self._connection().execute('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)', (name, value))
+
+    # Elimina las entradas de un espacio cuya versión no está en keep_versions
+    def invalidate(self, namespaces, keep_versions):
+        connection = self._connection()
+        namespace_marks = ','.join('?' * len(namespaces))
+        version_marks = ','.join('?' * len(keep_versions))
+        connection.execute(
+            f'DELETE FROM entries WHERE namespace IN ({namespace_marks}) AND version NOT IN ({version_marks})',
+            (*namespaces, *keep_versions)
+        )
+
+    def stats(self):
+        row = self._connection().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        return {'entries': row[0], 'bytes': row[1]}
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+# Instancia única del caché por proceso
+def get_shared_cache():
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = SharedCache()
+        return _shared_cache
+
+
+# Atajo para guardar cualquier resultado derivado de una versión de los datos
+def shared_result(namespace, version, params, compute):
+    return get_shared_cache().get_or_compute(namespace, version, params, compute)
+
+
+def _download(url):
+    if os.path.exists(url):
+        with open(url, 'rb') as f:
+            return f.read()
+    with urllib.request.urlopen(url, timeout=60) as response:
+        return response.read()
+
+
+# Espacios de resultados que dependen de la versión de los datos
+VERSIONED_NAMESPACES = ('dataset', 'consulta', 'metricas', 'grafico', 'excel', 'calentamiento', 'reporte', 'plan')
+
+
+_loaded_lock = threading.Lock()
+_loaded = {}
+
+
+# Descarga la hoja una vez por intervalo de refresco y por máquina, no por proceso.
+# Los valores atípicos se marcan una sola vez por versión de los datos, al cargarlos.
+# Con warm=True también se inicia el precalentado del caché (warming.py) cuando cambia el contenido.
+def load_shared_csv(url, refresh_seconds=DATA_REFRESH_SECONDS, warm=True):
+    refresh_slot = str(int(time.time() // refresh_seconds))
+
+    # Dentro del mismo intervalo, las ejecuciones del proceso reutilizan el DataFrame ya cargado
+    with _loaded_lock:
+        loaded = _loaded.get(url)
+    if loaded is not None and loaded[0] == refresh_slot:
+        return loaded[2]
+
+    cache = get_shared_cache()
+    raw = cache.get_or_compute('csv', refresh_slot, url, lambda: _download(url))
+    # Sólo se conserva la descarga del intervalo actual, aunque la hoja no haya cambiado
+    cache.invalidate(('csv',), [refresh_slot])
+
+    # La versión de los datos es el hash del contenido: si la hoja no cambió, se conservan los resultados
+    version = hashlib.sha1(raw).hexdigest()[:16]
+    new_version = cache.get_meta('data_version:' + url) != version
+    if new_version:
+        cache.invalidate(VERSIONED_NAMESPACES, [version])
+        cache.set_meta('data_version:' + url, version)
+
+    if loaded is not None and loaded[1] == version:
+        data = loaded[2]
+    else:
+        data = cache.get_or_compute('dataset', version, (url, 'atipicos'), lambda: flag_outliers(pd.read_csv(io.BytesIO(raw), header=0)))
+        data.attrs['version'] = version
+    with _loaded_lock:
+        _loaded[url] = (refresh_slot, version, data)
+
+    if warm:
+        # Importación diferida: warming.py usa este módulo
+        from warming import start_cache_warmer, warm_version
+        start_cache_warmer(url)
+        if new_version:
+            warm_version(url, data)
+    return data
+
+
+class SharedCacheBackend:
+    """Envuelve un backend de consultas y guarda sus resultados en el caché compartido."""
+
+    def __init__(self, backend, version, variant=''):
+        self.backend = backend
+        self.name = backend.name
+        self.version = version
+        self.variant = variant
+
+    def aggregate(self, table, selected_years, selected_station='Todas', selected_countries=('Todos',)):
+        return self.group(*QUERY_TABLES[table], selected_years, selected_station, selected_countries)
+
+    def group(self, row, column, selected_years, selected_station='Todas', selected_countries=('Todos',)):
+        params = (self.variant, row, column, tuple(int(year) for year in selected_years), selected_station, tuple(sorted(selected_countries)))
+        return shared_result(
+            'consulta', self.version, params,
+            lambda: self.backend.group(row, column, selected_years, selected_station, selected_countries)
+        )
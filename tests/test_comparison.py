@@ -0,0 +1,39 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, 'benchmarks'))
+
+from comparison import compare_panels, fine_aggregates
+from kpi_tables import apply_filters, summary_metrics
+from synthetic_data import make_kpi_data
+
+
+@pytest.fixture
+def data():
+    data = make_kpi_data(5000, seed=3)
+    # Filas sin país, sin estación, sin año o sin proyecto, como las que trae la hoja
+    data.loc[data.index[:20], 'Pais'] = np.nan
+    data.loc[data.index[20:35], 'Tipo_KPI'] = np.nan
+    data.loc[data.index[35:40], 'AÑO'] = np.nan
+    data.loc[data.index[40:43], 'IDEtapa'] = np.nan
+    return data
+
+
+@pytest.mark.parametrize('panel', [
+    ((2015, 2023), 'Todas', ['Todos']),
+    ((2017, 2020), 'Todas', ['Todos']),
+    ((2015, 2023), 'Vigencia', ['Todos']),
+    ((2016, 2022), 'Todas', ['Brasil', 'Uruguay']),
+])
+def test_panel_metrics_match_page_metrics(data, panel):
+    result, = compare_panels(fine_aggregates(data), [panel])
+    expected = summary_metrics(apply_filters(data, *panel))
+
+    assert result['metrics']['unique_operation_count'] == expected['unique_operation_count']
+    assert result['metrics']['total_stations'] == expected['total_stations']
+    assert result['metrics']['average_kpi'] == pytest.approx(expected['average_kpi'])
@@ -0,0 +1,101 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, 'benchmarks'))
+
+import shared_cache
+from dashboard_spec import EFICIENCIA_PLAN, GRAFICOS_PLAN
+from kpi_tables import apply_filters, filter_key
+from query_backend import create_backend, duckdb
+from shared_cache import SharedCache
+from synthetic_data import make_kpi_data
+
+BACKENDS = ['pandas', pytest.param('duckdb', marks=pytest.mark.skipif(duckdb is None, reason="duckdb no instalado"))]
+
+FILTERS = [
+    ((2015, 2023), 'Todas', ['Todos']),
+    ((2017, 2021), 'Vigencia', ['Todos']),
+    ((2016, 2022), 'Todas', ['Brasil', 'Uruguay']),
+]
+
+
+# Tablas armadas como lo hacían las páginas antes del plan, con pivot_table sobre las filas filtradas
+def _mean(df, index, columns):
+    return df.pivot_table(values='KPI', index=index, columns=columns, aggfunc='mean')
+
+
+def _with_counts(df, index, columns):
+    counts = df.pivot_table(values='KPI', index=index, columns=columns, aggfunc='count').fillna(0)
+    counts.columns = [f"{col}_count" for col in counts.columns]
+    return counts
+
+
+def _country_year_table(df):
+    table = _mean(df, 'Pais', 'AÑO').round(2).fillna('')
+    table.columns = table.columns.astype(int)
+    return table.reset_index()
+
+
+def _eficiencia_expected(df):
+    station_country = _mean(df, 'Tipo_KPI', 'Pais').fillna(0).round(2)
+    station_country['Total_Estaciones'] = station_country.index.map(df['Tipo_KPI'].value_counts())
+    return {
+        'station_country_table': station_country.fillna(''),
+        'country_year_table': _country_year_table(df),
+        'country_year_summary': pd.concat([_mean(df, 'Pais', 'AÑO').fillna(0), _with_counts(df, 'Pais', 'AÑO')], axis=1).round(2),
+        'station_year_table': pd.concat([_mean(df, 'Tipo_KPI', 'AÑO'), _with_counts(df, 'Tipo_KPI', 'AÑO')], axis=1).round(2).fillna(''),
+        'year_station_chart': _mean(df, 'AÑO', 'Tipo_KPI').fillna(0),
+    }
+
+
+def _graficos_expected(df):
+    return {
+        'year_station_chart': _mean(df, 'AÑO', 'Tipo_KPI').fillna(0),
+        'country_year_table': _country_year_table(df),
+        'country_year_chart': _mean(df, 'Pais', 'AÑO').fillna(0),
+        'station_country_table': _mean(df, 'Tipo_KPI', 'Pais').round(2).fillna(''),
+        'country_station_chart': df.groupby(['Pais', 'Tipo_KPI'])['KPI'].mean().unstack(fill_value=0),
+        'station_year_table': _mean(df, 'Tipo_KPI', 'AÑO').round(2).fillna(''),
+    }
+
+
+@pytest.fixture
+def data():
+    data = make_kpi_data(3000, seed=5)
+    data['AÑO'] = data['AÑO'].astype(int)
+    return data
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    cache = SharedCache(str(tmp_path / 'cache.sqlite'))
+    monkeypatch.setattr(shared_cache, '_shared_cache', cache)
+    return cache
+
+
+@pytest.mark.parametrize('backend_name', BACKENDS)
+@pytest.mark.parametrize('plan, expected', [(EFICIENCIA_PLAN, _eficiencia_expected), (GRAFICOS_PLAN, _graficos_expected)])
+@pytest.mark.parametrize('filters', FILTERS)
+def test_plan_matches_pivot_tables(data, backend_name, plan, expected, filters):
+    backend = create_backend(data, backend_name)
+    outputs = plan.run(backend, 'v1', filter_key(*filters, False), *filters, parallel=False)
+
+    for name, table in expected(apply_filters(data, *filters)).items():
+        pd.testing.assert_frame_equal(outputs[name], table, check_dtype=False, check_names=False,
+                                      check_index_type=False, check_column_type=False, obj=name)
+
+
+def test_plans_share_groupings(data, cache):
+    backend = shared_cache.SharedCacheBackend(create_backend(data, 'pandas'), 'v1', 'todos')
+    filters = FILTERS[0]
+    EFICIENCIA_PLAN.run(backend, 'v1', filter_key(*filters, False), *filters, parallel=False)
+    queries = cache.execute("SELECT COUNT(*) FROM entries WHERE namespace = 'consulta'").fetchone()[0]
+
+    # Gráficos Generales pide las mismas agrupaciones en otro orden: no se calcula ninguna consulta nueva
+    GRAFICOS_PLAN.run(backend, 'v1', filter_key(*filters, False), *filters, parallel=False)
+    assert cache.execute("SELECT COUNT(*) FROM entries WHERE namespace = 'consulta'").fetchone()[0] == queries
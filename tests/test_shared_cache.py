@@ -0,0 +1,152 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shared_cache
+from shared_cache import SharedCache, _MISSING
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SharedCache(str(tmp_path / 'cache.sqlite'))
+
+
+def test_get_returns_missing_until_set(cache):
+    assert cache.get('consulta', 'v1', ('a', 1)) is _MISSING
+    cache.set('consulta', 'v1', ('a', 1), {'valor': 1})
+    assert cache.get('consulta', 'v1', ('a', 1)) == {'valor': 1}
+    assert cache.get('consulta', 'v2', ('a', 1)) is _MISSING
+
+
+def test_eviction_drops_least_recently_used(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(shared_cache.time, 'time', lambda: now[0])
+    cache = SharedCache(str(tmp_path / 'cache.sqlite'), max_bytes=2500)
+    payload = b'x' * 1000
+    cache.set('excel', 'v1', 'a', payload)
+    now[0] += 1
+    cache.set('excel', 'v1', 'b', payload)
+    # Leer 'a' la vuelve la entrada más reciente; al agregar 'c' se elimina 'b'
+    now[0] += shared_cache.ACCESS_RESOLUTION_SECONDS + 1
+    cache.get('excel', 'v1', 'a')
+    now[0] += 1
+    cache.set('excel', 'v1', 'c', payload)
+
+    assert cache.contains('excel', 'v1', 'a')
+    assert not cache.contains('excel', 'v1', 'b')
+    assert cache.contains('excel', 'v1', 'c')
+    assert cache.stats()['bytes'] <= 2500
+
+
+def test_recent_reads_do_not_write(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(shared_cache.time, 'time', lambda: now[0])
+    cache.set('consulta', 'v1', 'p', 1)
+    key = cache.make_key('consulta', 'v1', 'p')
+
+    def last_access():
+        return cache.execute('SELECT last_access FROM entries WHERE key = ?', (key,)).fetchone()[0]
+
+    # Dentro de la precisión del último acceso, una lectura no escribe en el archivo
+    now[0] += shared_cache.ACCESS_RESOLUTION_SECONDS - 1
+    changes = cache.execute('SELECT total_changes()').fetchone()[0]
+    assert cache.get('consulta', 'v1', 'p') == 1
+    assert cache.execute('SELECT total_changes()').fetchone()[0] == changes
+    assert last_access() == 1000.0
+
+    now[0] += 2
+    cache.get('consulta', 'v1', 'p')
+    assert last_access() == now[0]
+
+
+def test_invalidate_keeps_only_listed_versions(cache):
+    cache.set('consulta', 'vieja', 'p', 1)
+    cache.set('consulta', 'nueva', 'p', 2)
+    cache.set('csv', 'vieja', 'p', 3)
+
+    cache.invalidate(('consulta',), ['nueva'])
+
+    assert not cache.contains('consulta', 'vieja', 'p')
+    assert cache.contains('consulta', 'nueva', 'p')
+    # Los otros espacios no se tocan
+    assert cache.contains('csv', 'vieja', 'p')
+
+
+def test_lease_is_exclusive_until_released_or_expired(cache, monkeypatch):
+    key = cache.make_key('consulta', 'v1', 'p')
+    assert cache._acquire_lease(key)
+    assert not cache._acquire_lease(key)
+
+    cache._release_lease(key)
+    assert cache._acquire_lease(key)
+
+    # Una reserva vencida (proceso caído) puede tomarse de nuevo
+    monkeypatch.setattr(shared_cache.time, 'time', lambda: 10 ** 12)
+    assert cache._acquire_lease(key)
+
+
+def test_get_or_compute_computes_once_across_threads(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    calls = []
+    results = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'resultado'
+
+    def worker():
+        # Una instancia por hilo, como si fueran procesos distintos sobre el mismo archivo
+        results.append(SharedCache(path).get_or_compute('consulta', 'v1', 'p', compute))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ['resultado'] * 4
+
+
+def test_get_or_compute_releases_lease_on_error(cache):
+    def failing():
+        raise ValueError('falla')
+
+    with pytest.raises(ValueError):
+        cache.get_or_compute('consulta', 'v1', 'p', failing)
+    assert cache.get_or_compute('consulta', 'v1', 'p', lambda: 'ok') == 'ok'
+
+
+def test_cache_directory_must_be_private(tmp_path):
+    shared = tmp_path / 'compartido'
+    shared.mkdir()
+    os.chmod(shared, 0o777)
+    with pytest.raises(PermissionError):
+        SharedCache(str(shared / 'cache.sqlite'))
+
+
+def test_load_shared_csv_keeps_only_current_slot(tmp_path, monkeypatch):
+    csv_path = tmp_path / 'kpi.csv'
+    csv_path.write_text('IDEtapa,Pais,Tipo_KPI,AÑO,KPI\n1,Brasil,Vigencia,2020,3.5\n', encoding='utf-8')
+
+    cache = SharedCache(str(tmp_path / 'cache.sqlite'))
+    monkeypatch.setattr(shared_cache, '_shared_cache', cache)
+    monkeypatch.setattr(shared_cache, '_loaded', {})
+
+    now = [1000.0]
+    monkeypatch.setattr(shared_cache.time, 'time', lambda: now[0])
+    for _ in range(3):
+        data = shared_cache.load_shared_csv(str(csv_path), refresh_seconds=10, warm=False)
+        now[0] += 10
+
+    # La hoja no cambió: una sola descarga guardada y la misma versión de los datos
+    csv_entries = cache.execute("SELECT COUNT(*) FROM entries WHERE namespace = 'csv'").fetchone()[0]
+    assert csv_entries == 1
+    assert data.attrs['version'] == cache.get_meta('data_version:' + str(csv_path))
+    assert bool(data['Outlier'].iloc[0]) is False
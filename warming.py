@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+import time
+
+from streamlit.logger import get_logger
+
+from kpi_tables import efficiency_outputs, filter_key
+from outliers import exclude_outliers
+from query_backend import data_variant, get_query_backend
+from shared_cache import SharedCacheBackend, get_shared_cache, load_shared_csv
+
+LOGGER = get_logger(__name__)
+
+# Cantidad de combinaciones de filtros que se precalculan tras cada actualización
+WARM_TOP_K = int(os.environ.get('KPI_WARM_TOP_K', 20))
+
+# Tiempo de CPU máximo que puede usar cada precalentado
+WARM_CPU_SECONDS = float(os.environ.get('KPI_WARM_CPU_SECONDS', 30))
+
+# Cada cuántos segundos el hilo en segundo plano revisa si hay datos nuevos
+WARM_CHECK_SECONDS = int(os.environ.get('KPI_WARM_CHECK_SECONDS', 60))
+
+_tables_lock = threading.Lock()
+_tables_ready = False
+
+
+# Tablas auxiliares en el mismo archivo del caché compartido
+def _warming_cache():
+    global _tables_ready
+    cache = get_shared_cache()
+    with _tables_lock:
+        if not _tables_ready:
+            # Sólo se guarda la combinación de filtros: no hay datos de la sesión ni del usuario
+            cache.execute('CREATE TABLE IF NOT EXISTS filter_log (params TEXT PRIMARY KEY, hits INTEGER NOT NULL, last_seen REAL NOT NULL)')
+            cache.execute('CREATE TABLE IF NOT EXISTS warmed (version TEXT NOT NULL, params TEXT NOT NULL, PRIMARY KEY (version, params))')
+            cache.execute('CREATE TABLE IF NOT EXISTS warm_stats (version TEXT PRIMARY KEY, requests INTEGER NOT NULL, warm_hits INTEGER NOT NULL)')
+            _tables_ready = True
+    return cache
+
+
+def _encode(selected_years, selected_station, selected_countries, exclude_flagged):
+    return json.dumps(filter_key(selected_years, selected_station, selected_countries, exclude_flagged), ensure_ascii=False)
+
+
+# Registra una selección de filtros y si sus resultados ya estaban precalentados
+def record_request(data_version, selected_years, selected_station, selected_countries, exclude_flagged):
+    cache = _warming_cache()
+    params = _encode(selected_years, selected_station, selected_countries, exclude_flagged)
+    cache.execute(
+        'INSERT INTO filter_log (params, hits, last_seen) VALUES (?, 1, ?) '
+        'ON CONFLICT(params) DO UPDATE SET hits = hits + 1, last_seen = excluded.last_seen',
+        (params, time.time())
+    )
+    warm = cache.execute('SELECT 1 FROM warmed WHERE version = ? AND params = ?', (data_version, params)).fetchone() is not None
+    cache.execute(
+        'INSERT INTO warm_stats (version, requests, warm_hits) VALUES (?, 1, ?) '
+        'ON CONFLICT(version) DO UPDATE SET requests = requests + 1, warm_hits = warm_hits + excluded.warm_hits',
+        (data_version, int(warm))
+    )
+
+
+# Proporción de pedidos de esta versión de los datos que encontraron sus resultados precalentados
+def warm_hit_rate(data_version):
+    row = _warming_cache().execute('SELECT requests, warm_hits FROM warm_stats WHERE version = ?', (data_version,)).fetchone()
+    if row is None or row[0] == 0:
+        return 0.0
+    return row[1] / row[0]
+
+
+# Las combinaciones de filtros más pedidas
+def top_filters(k=WARM_TOP_K):
+    rows = _warming_cache().execute('SELECT params FROM filter_log ORDER BY hits DESC, last_seen DESC LIMIT ?', (k,)).fetchall()
+    return [tuple(json.loads(row[0])) for row in rows]
+
+
+# Precalcula métricas, tablas, gráfico y archivos de Excel de las combinaciones más pedidas
+def warm_top_filters(data, data_version, k=WARM_TOP_K, cpu_seconds=WARM_CPU_SECONDS):
+    cache = _warming_cache()
+    start = time.thread_time()
+    backends = {}
+    warmed = 0
+    for selected_years, selected_station, selected_countries, exclude_flagged in top_filters(k):
+        # Respetar el presupuesto de CPU: las combinaciones restantes se calculan a pedido
+        if time.thread_time() - start > cpu_seconds:
+            break
+
+        variant = data_variant(exclude_flagged)
+        if variant not in backends:
+            variant_data = exclude_outliers(data) if exclude_flagged else data
+            # Backend de pandas: DuckDB calcula en sus propios hilos y thread_time no mediría esa CPU
+            backend = get_query_backend(data_version, variant, variant_data, 'pandas')
+            backends[variant] = (variant_data, SharedCacheBackend(backend, data_version, variant))
+        variant_data, backend = backends[variant]
+
+        # Los nodos se calculan en este hilo: así thread_time mide toda la CPU del precalentado
+        efficiency_outputs(backend, variant_data, data_version, selected_years, selected_station, list(selected_countries),
+                           exclude_flagged, parallel=False)
+        cache.execute(
+            'INSERT OR IGNORE INTO warmed (version, params) VALUES (?, ?)',
+            (data_version, _encode(selected_years, selected_station, selected_countries, exclude_flagged))
+        )
+        warmed += 1
+
+    return {'warmed': warmed, 'cpu_seconds': round(time.thread_time() - start, 2)}
+
+
+def _warm(url, data):
+    cache = _warming_cache()
+    data_version = data.attrs['version']
+    try:
+        if cache.get_meta('warmed_version:' + url) != data_version:
+            # Sólo un proceso precalienta cada versión; los demás esperan su reporte
+            report = cache.get_or_compute(
+                'calentamiento', data_version, url,
+                lambda: warm_top_filters(data, data_version)
+            )
+            cache.set_meta('warmed_version:' + url, data_version)
+            cache.execute('DELETE FROM warmed WHERE version != ?', (data_version,))
+            cache.execute('DELETE FROM warm_stats WHERE version != ?', (data_version,))
+            LOGGER.info("Caché precalentado para la versión %s: %s", data_version, report)
+    except Exception:
+        LOGGER.exception("Error al precalentar el caché")
+
+
+_warmed_lock = threading.Lock()
+_warmed_versions = set()
+
+
+# Precalienta una versión de los datos en segundo plano, una sola vez por proceso.
+# load_shared_csv lo llama apenas detecta que el contenido de la hoja cambió.
+def warm_version(url, data):
+    key = (url, data.attrs['version'])
+    with _warmed_lock:
+        if key in _warmed_versions:
+            return
+        _warmed_versions.add(key)
+    threading.Thread(target=_warm, args=(url, data), name='kpi-cache-warm', daemon=True).start()
+
+
+def _warm_loop(url):
+    while True:
+        try:
+            # La descarga compartida detecta la actualización de los datos y lanza el precalentado;
+            # además se revisa aquí por si el proceso que detectó el cambio terminó antes de precalentar
+            warm_version(url, load_shared_csv(url))
+        except Exception:
+            LOGGER.exception("Error al revisar si hay datos nuevos")
+        time.sleep(WARM_CHECK_SECONDS)
+
+
+_warmers_lock = threading.Lock()
+_warmers = {}
+
+
+# Inicia (una sola vez por proceso) el hilo que revisa si hay datos nuevos; load_shared_csv lo inicia
+# en la primera carga desde cualquier página
+def start_cache_warmer(url):
+    with _warmers_lock:
+        if url not in _warmers:
+            thread = threading.Thread(target=_warm_loop, args=(url,), name='kpi-cache-warmer', daemon=True)
+            thread.start()
+            _warmers[url] = thread
+    return _warmers[url]